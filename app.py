@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()
+
 import os
 import logging
 from flask import Flask
@@ -5,75 +8,117 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config
+from logging_setup import configure_logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (JSON lines written by a background thread, level from LOG_LEVEL)
+configure_logging()
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# configure the database, relative to the app instance folder
-database_url = os.environ.get("DATABASE_URL", "sqlite:///tradingview_access.db")
-# Fix for Render PostgreSQL URLs
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# initialize the app with the extension
-db.init_app(app)
-
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'main.manage_login'
 login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    import principal_cache
+    return principal_cache.load(int(user_id))
+
+
+def create_app():
+    """Create and configure the Flask application (no database access)"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # configure the database, relative to the app instance folder
+    database_url = os.environ.get("DATABASE_URL", "sqlite:///tradingview_access.db")
+    # Fix for Render PostgreSQL URLs
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if not database_url.startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+            "pool_size": Config.DB_POOL_SIZE,
+            "max_overflow": Config.DB_MAX_OVERFLOW,
+        })
 
-# Import and register routes
-from routes import main_bp
-app.register_blueprint(main_bp)
+    # initialize the app with the extensions
+    db.init_app(app)
+    login_manager.init_app(app)
 
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
+    # Request timing and SQL statement counts for /metrics
+    import metrics
+    metrics.init_app(app)
+
+    # Opt-in cProfile runs for admin requests (X-Profile: 1 or ?profile=1)
+    import profiling
+    profiling.init_app(app)
+
+    # Import and register routes
+    from routes import main_bp
+    app.register_blueprint(main_bp)
+
+    # Make sure to import the models here or their tables won't be known to the metadata
     import models  # noqa: F401
-    db.create_all()
-    
-    # Initialize backup system
-    try:
-        from backup_system import BackupManager
-        backup_manager = BackupManager()
-        backup_file = backup_manager.auto_backup()
-        if backup_file:
-            logging.info("Backup system initialized and auto-backup created successfully")
-        else:
-            logging.warning("Backup system initialized but auto-backup failed")
-    except Exception as e:
-        logging.error(f"Failed to initialize backup system: {str(e)}")
-    
-    # Create default admin user if it doesn't exist
-    admin_user = models.User.query.filter_by(email='admin@tradingview.com').first()
-    if not admin_user:
-        admin_user = models.User(
-            email='admin@tradingview.com',
-            name='Admin User',
-            is_admin=True
-        )
-        admin_user.set_password('admin123')  # Change this in production
-        db.session.add(admin_user)
-        db.session.commit()
-        logging.info("Default admin user created: admin@tradingview.com / admin123")
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create tables, take a backup and ensure the default admin exists."""
+        init_database(app)
+
+    return app
+
+
+def init_database(app, backup=True):
+    """One-time setup: create tables, take a backup and ensure the default admin exists"""
+    import models
+
+    with app.app_context():
+        db.create_all()
+
+        # Initialize backup system
+        if backup:
+            try:
+                from backup_system import BackupManager
+                backup_manager = BackupManager()
+                backup_file = backup_manager.auto_backup()
+                if backup_file:
+                    logging.info("Backup system initialized and auto-backup created successfully")
+                else:
+                    logging.warning("Backup system initialized but auto-backup failed")
+            except Exception as e:
+                logging.error(f"Failed to initialize backup system: {str(e)}")
+
+        # Create default admin user if it doesn't exist
+        admin_user = models.User.query.filter_by(email='admin@tradingview.com').first()
+        if not admin_user:
+            admin_user = models.User(
+                email='admin@tradingview.com',
+                name='Admin User',
+                is_admin=True
+            )
+            admin_user.set_password('admin123')  # Change this in production
+            db.session.add(admin_user)
+            db.session.commit()
+            logging.info("Default admin user created: admin@tradingview.com / admin123")
+
+
+# create the app
+app = create_app()
+
+# 'eager' keeps the legacy behaviour of running the one-time setup on every import
+if Config.STARTUP_MODE == 'eager':
+    init_database(app)
+
+app.config['STARTUP_TIME_MS'] = round((time.perf_counter() - _import_started) * 1000, 1)
+logging.info(f"Application created in {app.config['STARTUP_TIME_MS']}ms ({Config.STARTUP_MODE} startup)")
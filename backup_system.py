@@ -7,15 +7,28 @@ Ensures data persistence and prevents data loss during restarts/deployments
 import os
 import json
 import logging
+import sqlite3
+import zipfile
 from datetime import datetime
 from app import app, db
+from config import Config
 from models import User, AccessKey, PineScript, UserAccess, AccessLog
+import pine_catalog
+import principal_cache
 
 logger = logging.getLogger(__name__)
 
+# Backup file extensions by format
+BACKUP_EXTENSIONS = {
+    'json': '.json',
+    'sqlite': '.sqlite3',
+    'pgcopy': '.pgcopy.zip',
+}
+
 class BackupManager:
     def __init__(self):
         self.backup_dir = os.path.join(os.getcwd(), 'backups')
+        self.manifest_file = os.path.join(self.backup_dir, 'manifest.json')
         self.ensure_backup_directory()
     
     def ensure_backup_directory(self):
@@ -24,8 +37,171 @@ class BackupManager:
             os.makedirs(self.backup_dir)
             logger.info(f"Created backup directory: {self.backup_dir}")
     
-    def create_backup(self, backup_name=None):
-        """Create a complete backup of all data"""
+    def get_dialect(self):
+        """Return the dialect name of the configured database engine"""
+        with app.app_context():
+            return db.engine.dialect.name
+    
+    def create_backup(self, backup_name=None, backup_format=None, kind='manual'):
+        """Create a complete backup of all data
+        
+        backup_format is 'native' (engine snapshot when supported, JSON
+        otherwise) or 'json' (portable cross-engine export). Defaults to
+        Config.BACKUP_FORMAT. The backup is recorded in the manifest as
+        the given kind ('auto' or 'manual').
+        """
+        if not backup_name:
+            backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        backup_format = backup_format or Config.BACKUP_FORMAT
+        if backup_format == 'native':
+            try:
+                dialect = self.get_dialect()
+            except Exception as e:
+                logger.error(f"Error detecting database dialect: {str(e)}")
+                print(f"❌ Error creating backup: {str(e)}")
+                return None
+            
+            if dialect == 'sqlite':
+                backup_file = self.create_sqlite_snapshot(backup_name)
+            elif dialect == 'postgresql':
+                backup_file = self.create_postgres_snapshot(backup_name)
+            else:
+                logger.info(f"No native snapshot for dialect '{dialect}', using JSON export")
+                backup_file = self.export_json(backup_name)
+        else:
+            backup_file = self.export_json(backup_name)
+        
+        if backup_file:
+            self.record_backup(backup_file, kind)
+        return backup_file
+    
+    def load_manifest(self):
+        """Load the backup manifest, reconciled against the files on disk
+        
+        Backups created before the manifest existed are adopted using their
+        file name prefix for the kind and their mtime for the creation time.
+        """
+        entries = {}
+        try:
+            if os.path.exists(self.manifest_file):
+                with open(self.manifest_file, 'r') as f:
+                    for entry in json.load(f).get('backups', []):
+                        entries[entry['name']] = entry
+        except Exception as e:
+            logger.error(f"Error reading backup manifest: {str(e)}")
+        
+        manifest = []
+        if os.path.exists(self.backup_dir):
+            for file in os.listdir(self.backup_dir):
+                backup_format = self.get_backup_format(file)
+                if not backup_format or file == os.path.basename(self.manifest_file):
+                    continue
+                entry = entries.get(file)
+                if not entry:
+                    mtime = os.stat(os.path.join(self.backup_dir, file)).st_mtime
+                    entry = {
+                        'name': file,
+                        'kind': 'auto' if file.startswith('auto_backup_') else 'manual',
+                        'format': backup_format,
+                        'created_at': datetime.fromtimestamp(mtime).isoformat()
+                    }
+                manifest.append(entry)
+        
+        manifest.sort(key=lambda x: x['created_at'], reverse=True)
+        return manifest
+    
+    def save_manifest(self, manifest):
+        """Atomically write the backup manifest"""
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'backups': manifest}, f, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+    
+    def record_backup(self, backup_file, kind):
+        """Add a newly created backup to the manifest"""
+        try:
+            name = os.path.basename(backup_file)
+            manifest = [entry for entry in self.load_manifest() if entry['name'] != name]
+            manifest.insert(0, {
+                'name': name,
+                'kind': kind,
+                'format': self.get_backup_format(name),
+                'created_at': datetime.now().isoformat()
+            })
+            self.save_manifest(manifest)
+        except Exception as e:
+            logger.error(f"Error recording backup in manifest: {str(e)}")
+    
+    def create_sqlite_snapshot(self, backup_name):
+        """Copy the SQLite database page by page using the online backup API"""
+        backup_file = os.path.join(self.backup_dir, f"{backup_name}{BACKUP_EXTENSIONS['sqlite']}")
+        tmp_file = f"{backup_file}.tmp"
+        
+        try:
+            with app.app_context():
+                raw_conn = db.engine.raw_connection()
+                try:
+                    dest = sqlite3.connect(tmp_file)
+                    try:
+                        raw_conn.driver_connection.backup(dest)
+                    finally:
+                        dest.close()
+                finally:
+                    raw_conn.close()
+            
+            os.replace(tmp_file, backup_file)
+            logger.info(f"SQLite snapshot created successfully: {backup_file}")
+            print(f"✅ Database backup created: {os.path.basename(backup_file)}")
+            return backup_file
+            
+        except Exception as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            logger.error(f"Error creating SQLite snapshot: {str(e)}")
+            print(f"❌ Error creating backup: {str(e)}")
+            return None
+    
+    def create_postgres_snapshot(self, backup_name):
+        """Stream every table out with COPY into a zip of CSV files"""
+        backup_file = os.path.join(self.backup_dir, f"{backup_name}{BACKUP_EXTENSIONS['pgcopy']}")
+        tmp_file = f"{backup_file}.tmp"
+        
+        try:
+            with app.app_context():
+                raw_conn = db.engine.raw_connection()
+                try:
+                    cursor = raw_conn.cursor()
+                    with zipfile.ZipFile(tmp_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+                        for table in db.metadata.sorted_tables:
+                            with archive.open(f"{table.name}.csv", 'w') as fh:
+                                cursor.copy_expert(
+                                    f'COPY "{table.name}" TO STDOUT WITH (FORMAT csv, HEADER true)', fh
+                                )
+                        archive.writestr('snapshot.json', json.dumps({
+                            'timestamp': datetime.now().isoformat(),
+                            'version': '1.0',
+                            'tables': [table.name for table in db.metadata.sorted_tables]
+                        }))
+                    cursor.close()
+                    raw_conn.commit()
+                finally:
+                    raw_conn.close()
+            
+            os.replace(tmp_file, backup_file)
+            logger.info(f"PostgreSQL snapshot created successfully: {backup_file}")
+            print(f"✅ Database backup created: {os.path.basename(backup_file)}")
+            return backup_file
+            
+        except Exception as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            logger.error(f"Error creating PostgreSQL snapshot: {str(e)}")
+            print(f"❌ Error creating backup: {str(e)}")
+            return None
+    
+    def export_json(self, backup_name=None):
+        """Export all data as portable JSON (restorable on any engine)"""
         if not backup_name:
             backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
@@ -122,22 +298,61 @@ class BackupManager:
             print(f"❌ Error creating backup: {str(e)}")
             return None
     
+    def get_backup_format(self, backup_file):
+        """Return the backup format implied by the file name, or None"""
+        for backup_format, extension in BACKUP_EXTENSIONS.items():
+            if backup_file.endswith(extension):
+                return backup_format
+        return None
+    
+    def resolve_backup_file(self, name):
+        """Resolve a backup name or path to an existing backup file"""
+        if os.path.exists(name):
+            return name
+        for extension in BACKUP_EXTENSIONS.values():
+            candidate = os.path.join(self.backup_dir, name if name.endswith(extension) else f"{name}{extension}")
+            if os.path.exists(candidate):
+                return candidate
+        return os.path.join(self.backup_dir, name)
+    
+    def _confirm_restore(self):
+        """Ask for interactive confirmation before replacing data"""
+        print("⚠️  WARNING: This will replace ALL existing data!")
+        confirm = input("Type 'CONFIRM' to proceed with restore: ")
+        if confirm != 'CONFIRM':
+            print("❌ Restore cancelled")
+            return False
+        return True
+    
     def restore_backup(self, backup_file):
-        """Restore data from backup file"""
+        """Restore data from backup file
+
+        Drops this process's user and script catalogue caches once restored.
+        """
+        restored = self._restore_backup(backup_file)
+        if restored:
+            principal_cache.clear()
+            pine_catalog.invalidate()
+        return restored
+    
+    def _restore_backup(self, backup_file):
         if not os.path.exists(backup_file):
             logger.error(f"Backup file not found: {backup_file}")
             return False
         
+        backup_format = self.get_backup_format(backup_file)
+        if backup_format == 'sqlite':
+            return self.restore_sqlite_snapshot(backup_file)
+        if backup_format == 'pgcopy':
+            return self.restore_postgres_snapshot(backup_file)
+        
         try:
             with open(backup_file, 'r') as f:
                 backup_data = json.load(f)
             
             with app.app_context():
                 # Clear existing data (with confirmation)
-                print("⚠️  WARNING: This will replace ALL existing data!")
-                confirm = input("Type 'CONFIRM' to proceed with restore: ")
-                if confirm != 'CONFIRM':
-                    print("❌ Restore cancelled")
+                if not self._confirm_restore():
                     return False
                 
                 # Clear tables in reverse dependency order
@@ -230,20 +445,106 @@ class BackupManager:
             print(f"❌ Error restoring backup: {str(e)}")
             return False
     
+    def restore_sqlite_snapshot(self, backup_file):
+        """Copy a SQLite snapshot back over the live database"""
+        try:
+            if self.get_dialect() != 'sqlite':
+                logger.error("SQLite snapshots can only be restored onto a SQLite database")
+                print("❌ Error restoring backup: snapshot requires a SQLite database, use a JSON export instead")
+                return False
+            
+            if not self._confirm_restore():
+                return False
+            
+            with app.app_context():
+                db.session.remove()
+                raw_conn = db.engine.raw_connection()
+                try:
+                    source = sqlite3.connect(backup_file)
+                    try:
+                        source.backup(raw_conn.driver_connection)
+                    finally:
+                        source.close()
+                finally:
+                    raw_conn.close()
+                # Drop pooled connections that may hold stale schema state
+                db.engine.dispose()
+            
+            logger.info(f"SQLite snapshot restored successfully from: {backup_file}")
+            print(f"✅ Database restored from backup: {backup_file}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error restoring SQLite snapshot: {str(e)}")
+            print(f"❌ Error restoring backup: {str(e)}")
+            return False
+    
+    def restore_postgres_snapshot(self, backup_file):
+        """Load a COPY snapshot back into PostgreSQL in a single transaction"""
+        try:
+            if self.get_dialect() != 'postgresql':
+                logger.error("COPY snapshots can only be restored onto a PostgreSQL database")
+                print("❌ Error restoring backup: snapshot requires a PostgreSQL database, use a JSON export instead")
+                return False
+            
+            if not self._confirm_restore():
+                return False
+            
+            with app.app_context():
+                db.session.remove()
+                tables = db.metadata.sorted_tables
+                raw_conn = db.engine.raw_connection()
+                try:
+                    cursor = raw_conn.cursor()
+                    with zipfile.ZipFile(backup_file, 'r') as archive:
+                        archive_tables = set(archive.namelist())
+                        table_list = ', '.join(f'"{table.name}"' for table in tables)
+                        cursor.execute(f'TRUNCATE {table_list} RESTART IDENTITY CASCADE')
+                        
+                        for table in tables:
+                            if f"{table.name}.csv" not in archive_tables:
+                                continue
+                            with archive.open(f"{table.name}.csv", 'r') as fh:
+                                cursor.copy_expert(
+                                    f'COPY "{table.name}" FROM STDIN WITH (FORMAT csv, HEADER true)', fh
+                                )
+                            # Move the id sequence past the restored rows
+                            cursor.execute(
+                                f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                                f'COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM "{table.name}"'
+                            )
+                    cursor.close()
+                    raw_conn.commit()
+                except Exception:
+                    raw_conn.rollback()
+                    raise
+                finally:
+                    raw_conn.close()
+            
+            logger.info(f"PostgreSQL snapshot restored successfully from: {backup_file}")
+            print(f"✅ Database restored from backup: {backup_file}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error restoring PostgreSQL snapshot: {str(e)}")
+            print(f"❌ Error restoring backup: {str(e)}")
+            return False
+    
     def list_backups(self):
         """List all available backup files"""
         backup_files = []
-        if os.path.exists(self.backup_dir):
-            for file in os.listdir(self.backup_dir):
-                if file.endswith('.json'):
-                    file_path = os.path.join(self.backup_dir, file)
-                    stat = os.stat(file_path)
-                    backup_files.append({
-                        'name': file,
-                        'path': file_path,
-                        'size': stat.st_size,
-                        'modified': datetime.fromtimestamp(stat.st_mtime)
-                    })
+        for entry in self.load_manifest():
+            file_path = os.path.join(self.backup_dir, entry['name'])
+            stat = os.stat(file_path)
+            backup_files.append({
+                'name': entry['name'],
+                'path': file_path,
+                'format': entry['format'],
+                'kind': entry['kind'],
+                'size': stat.st_size,
+                'modified': datetime.fromtimestamp(stat.st_mtime),
+                'created_at': datetime.fromisoformat(entry['created_at'])
+            })
         
         backup_files.sort(key=lambda x: x['modified'], reverse=True)
         return backup_files
@@ -251,26 +552,74 @@ class BackupManager:
     def auto_backup(self):
         """Create automatic backup (called on app startup)"""
         try:
-            backup_file = self.create_backup(f"auto_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            backup_file = self.create_backup(f"auto_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}", kind='auto')
             if backup_file:
-                # Keep only last 10 auto backups
-                self.cleanup_old_backups(keep_count=10, prefix="auto_backup_")
+                self.cleanup_old_backups()
             return backup_file
         except Exception as e:
             logger.error(f"Auto backup failed: {str(e)}")
             return None
     
-    def cleanup_old_backups(self, keep_count=10, prefix="auto_backup_"):
-        """Remove old backup files, keeping only the specified count"""
+    def select_backups_to_keep(self, manifest, hourly, daily, weekly):
+        """Pick the backups retained by a grandfather-father-son policy
+        
+        Walking newest first, the newest backup in each of the latest
+        `hourly` hours, `daily` days and `weekly` ISO weeks is kept. The
+        most recent backup is always kept.
+        """
+        tiers = [
+            (hourly, lambda dt: dt.strftime('%Y-%m-%d %H')),
+            (daily, lambda dt: dt.strftime('%Y-%m-%d')),
+            (weekly, lambda dt: dt.isocalendar()[:2]),
+        ]
+        
+        keep = set()
+        if manifest:
+            keep.add(manifest[0]['name'])
+        
+        for count, bucket_of in tiers:
+            buckets = set()
+            for entry in manifest:
+                if len(buckets) >= count:
+                    break
+                bucket = bucket_of(datetime.fromisoformat(entry['created_at']))
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(entry['name'])
+        
+        return keep
+    
+    def cleanup_old_backups(self, hourly=None, daily=None, weekly=None, dry_run=False):
+        """Prune backups of every kind with tiered (GFS) retention
+        
+        Counts default to Config.BACKUP_KEEP_HOURLY/DAILY/WEEKLY. Returns
+        the names of the removed (or, with dry_run, removable) backups.
+        """
+        hourly = Config.BACKUP_KEEP_HOURLY if hourly is None else hourly
+        daily = Config.BACKUP_KEEP_DAILY if daily is None else daily
+        weekly = Config.BACKUP_KEEP_WEEKLY if weekly is None else weekly
+        
+        removed = []
         try:
-            backup_files = [f for f in self.list_backups() if f['name'].startswith(prefix)]
-            if len(backup_files) > keep_count:
-                files_to_remove = backup_files[keep_count:]
-                for file_info in files_to_remove:
-                    os.remove(file_info['path'])
-                    logger.info(f"Removed old backup: {file_info['name']}")
+            manifest = self.load_manifest()
+            keep = self.select_backups_to_keep(manifest, hourly, daily, weekly)
+            
+            remaining = []
+            for entry in manifest:
+                if entry['name'] in keep:
+                    remaining.append(entry)
+                    continue
+                if not dry_run:
+                    os.remove(os.path.join(self.backup_dir, entry['name']))
+                    logger.info(f"Removed old backup: {entry['name']}")
+                removed.append(entry['name'])
+            
+            if not dry_run:
+                self.save_manifest(remaining)
         except Exception as e:
             logger.error(f"Error cleaning up backups: {str(e)}")
+        
+        return removed
 
 
 def init_backup_system():
@@ -292,8 +641,10 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python backup_system.py backup [name]     - Create backup")
+        print("  python backup_system.py export [name]     - Create portable JSON export")
         print("  python backup_system.py restore <file>    - Restore from backup")
         print("  python backup_system.py list             - List backups")
+        print("  python backup_system.py cleanup          - Apply retention policy")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -302,13 +653,19 @@ if __name__ == "__main__":
         name = sys.argv[2] if len(sys.argv) > 2 else None
         backup_manager.create_backup(name)
     
+    elif command == "export":
+        name = sys.argv[2] if len(sys.argv) > 2 else None
+        backup_manager.create_backup(name, 'json')
+    
+    elif command == "cleanup":
+        removed = backup_manager.cleanup_old_backups()
+        print(f"Removed {len(removed)} backup(s)")
+    
     elif command == "restore":
         if len(sys.argv) < 3:
             print("Error: Please specify backup file")
             sys.exit(1)
-        backup_file = sys.argv[2]
-        if not backup_file.endswith('.json'):
-            backup_file = os.path.join(backup_manager.backup_dir, f"{backup_file}.json")
+        backup_file = backup_manager.resolve_backup_file(sys.argv[2])
         backup_manager.restore_backup(backup_file)
     
     elif command == "list":
@@ -0,0 +1,521 @@
+"""
+Background bulk jobs against TradingView
+Fans one operation (granting a new script to every subscriber, revoking a
+deleted script from every holder, moving holders from a republished
+script's old pine_id to its new one) out on a bounded thread pool, through
+the shared rate limiter and circuit breaker. Progress and a resume cursor live
+on the job's row and commit together with each batch's bulk UserAccess and
+AccessLog writes, so a crashed or cancelled job picks up where it stopped
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from config import Config
+from models import AccessLog, BulkJob, PineScript, User, UserAccess
+import metrics
+import pine_catalog
+import principal_cache
+from resilience import CircuitOpenError, DeadlineExceeded
+from tradingview import call_lane, circuit_breaker, get_tv_api
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+RESUMABLE_STATUSES = ('pending', 'failed', 'cancelled')
+
+NOT_AUTHENTICATED = 'Failed: not authenticated'
+# Statuses (as TradingViewAPI._describe_failure words them) that say TradingView is down, not the row is bad
+OUTAGE_STATUSES = (NOT_AUTHENTICATED, 'Failed: TradingView temporarily unavailable', 'Failed: Deadline exceeded')
+
+# {kind: handler(job, params)}, filled in by @job_handler
+JOB_HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    """Raised between batches once an admin has asked the job to stop"""
+
+
+def job_handler(kind):
+    """Register the function that runs jobs of `kind`"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def create_job(kind, params, created_by=None):
+    """Store a pending job; returns (job, created)
+
+    An unfinished job with the same kind and params is returned instead of
+    creating a duplicate.
+    """
+    encoded = json.dumps(params, sort_keys=True)
+    existing = BulkJob.query.filter(
+        BulkJob.kind == kind,
+        BulkJob.params == encoded,
+        BulkJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(BulkJob.id.desc()).first()
+    if existing:
+        return existing, False
+    job = BulkJob(kind=kind, params=encoded, created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    return job, True
+
+
+def is_stale(job):
+    """A running job whose heartbeat stopped (its worker died) and can be taken over"""
+    return job.status == 'running' and job.updated_at is not None and \
+        job.updated_at < datetime.utcnow() - timedelta(seconds=Config.BULK_JOB_STALE_SECONDS)
+
+
+def claim_job(job_id):
+    """Mark the job running; False if it finished or another thread or worker is running it"""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=Config.BULK_JOB_STALE_SECONDS)
+    claimed = BulkJob.query.filter(
+        BulkJob.id == job_id,
+        db.or_(
+            BulkJob.status.in_(RESUMABLE_STATUSES),
+            db.and_(BulkJob.status == 'running', BulkJob.updated_at < stale_before)
+        )
+    ).update({
+        BulkJob.status: 'running',
+        BulkJob.cancel_requested: False,
+        BulkJob.last_error: None,
+        BulkJob.finished_at: None,
+        BulkJob.started_at: db.func.coalesce(BulkJob.started_at, now),
+        BulkJob.updated_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def start_job(job_id):
+    """Claim the job and run it on a background thread; returns False if it could not be claimed"""
+    if not claim_job(job_id):
+        return False
+    app = current_app._get_current_object()
+    thread = threading.Thread(target=_run_with_app, args=(app, job_id), name=f'bulk-job-{job_id}', daemon=True)
+    thread.start()
+    return True
+
+
+def _run_with_app(app, job_id):
+    with app.app_context():
+        run_job(job_id)
+
+
+def run_job(job_id):
+    """Run a claimed job to the end in the current thread (needs an app context)"""
+    job = db.session.get(BulkJob, job_id)
+    handler = JOB_HANDLERS.get(job.kind)
+    logger.info(f"Bulk job {job_id} ({job.kind}) started at cursor {job.cursor}")
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{job.kind}'")
+        handler(job, json.loads(job.params))
+        job.status = 'completed'
+    except JobCancelled:
+        db.session.rollback()
+        job.status = 'cancelled'
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk job {job_id} failed: {e}")
+        job.status = 'failed'
+        job.last_error = str(e)[:1000]
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Bulk job {job_id} {job.status}: {job.succeeded} succeeded, {job.failed} failed")
+    return job
+
+
+def request_cancel(job):
+    """Stop a job: pending jobs are cancelled at once, running ones after their current batch"""
+    if job.status == 'pending':
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+    elif job.status == 'running':
+        job.cancel_requested = True
+    db.session.commit()
+
+
+def job_payload(job):
+    """JSON-ready progress summary of a job"""
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'cancel_requested': job.cancel_requested,
+        'total': job.total,
+        'processed': job.processed,
+        'succeeded': job.succeeded,
+        'failed': job.failed,
+        'progress': min(100, round(100 * job.processed / job.total)) if job.total else (100 if job.status == 'completed' else 0),
+        'last_error': job.last_error,
+        'resumable': job.status in ('failed', 'cancelled') or is_stale(job),
+        'created_by': job.created_by,
+        'created_at': iso(job.created_at),
+        'started_at': iso(job.started_at),
+        'finished_at': iso(job.finished_at),
+        'updated_at': iso(job.updated_at)
+    }
+
+
+def fan_out(call, rows, owner=None):
+    """Run call(row) for every row on BULK_JOB_CONCURRENCY threads; returns [(row, result, error)]
+
+    Each call gets its own app context (and so its own DB session). Its
+    TradingView requests queue in the scheduler's bulk lane as `owner`, behind
+    interactive requests and taking turns with other jobs.
+    """
+    app = current_app._get_current_object()
+
+    def run(row):
+        with app.app_context(), call_lane('bulk', owner):
+            try:
+                return row, call(row), None
+            except Exception as e:
+                logger.error(f"Bulk job call failed for {row}: {e}")
+                return row, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(Config.BULK_JOB_CONCURRENCY, len(rows)))) as pool:
+        return list(pool.map(run, rows))
+
+
+@contextmanager
+def heartbeat(job_id):
+    """Keep the job's updated_at fresh while a batch runs, so a slow batch is not taken for a crash"""
+    interval = max(1, Config.BULK_JOB_STALE_SECONDS / 5)
+    stopped = threading.Event()
+    app = current_app._get_current_object()
+    table = BulkJob.__table__
+
+    def beat():
+        with app.app_context():
+            while not stopped.wait(interval):
+                try:
+                    # Own connection: the job's session must not commit mid-batch
+                    with db.engine.begin() as conn:
+                        conn.execute(table.update().where(table.c.id == job_id).values(updated_at=datetime.utcnow()))
+                except Exception as e:
+                    logger.warning(f"Bulk job {job_id} heartbeat failed: {e}")
+
+    thread = threading.Thread(target=beat, name=f'bulk-job-{job_id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def process_in_batches(job, fetch_batch, call, record):
+    """Drive a job over every row fetch_batch returns, one checkpoint per batch
+
+    fetch_batch(after_id, limit) returns rows ordered by a unique id in their
+    first column; call(row) is made concurrently with no DB transaction open;
+    record(outcomes) adds the writes for those outcomes to the session and
+    returns how many rows succeeded. Those writes and the new cursor commit
+    together. Rows that fail on their own are recorded as failed and passed;
+    an outage stops the job at the first row it hit, after checkpointing the
+    rows before it, so resuming retries from there.
+    """
+    while True:
+        db.session.refresh(job)
+        if job.cancel_requested:
+            raise JobCancelled()
+        rows = fetch_batch(job.cursor, Config.BULK_JOB_BATCH_SIZE)
+        # End the read transaction so no pooled connection is held during TradingView calls
+        db.session.commit()
+        if not rows:
+            return
+
+        with heartbeat(job.id):
+            outcomes = fan_out(call, rows, owner=f'job-{job.id}')
+        stop = first_outage(outcomes)
+        done = outcomes[:stop]
+        if done:
+            succeeded = record(done)
+            job.cursor = done[-1][0][0]
+            job.processed += len(done)
+            job.succeeded += succeeded
+            job.failed += len(done) - succeeded
+            db.session.commit()
+            metrics.bulk_job_items_total.inc(succeeded, kind=job.kind, outcome='success')
+            metrics.bulk_job_items_total.inc(len(done) - succeeded, kind=job.kind, outcome='failed')
+            logger.info(f"Bulk job {job.id}: {job.processed}/{job.total} processed, {job.failed} failed")
+        if stop is not None:
+            row, result, error = outcomes[stop]
+            reason = outcome_status(result, error) if is_outage(result, error) else 'circuit open'
+            raise RuntimeError(f"TradingView is unavailable ({reason}); resume the job once it recovers")
+
+
+def insert_missing_accesses(rows):
+    """Insert UserAccess rows, skipping each (user_id, pine_script_id) that exists by now
+
+    Batches check for existing grants before their TradingView calls; a user
+    can grant the same script themselves while those calls run.
+    """
+    if not rows:
+        return
+    table = UserAccess.__table__
+    params = [db.bindparam('user_id', type_=db.Integer), db.bindparam('pine_script_id', type_=db.Integer),
+              db.bindparam('tradingview_username', type_=db.String), db.bindparam('granted_at', type_=db.DateTime)]
+    already_held = db.select(table.c.id).where(
+        table.c.user_id == params[0], table.c.pine_script_id == params[1])
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'pine_script_id', 'tradingview_username', 'granted_at'],
+        db.select(*params).where(~db.exists(already_held))
+    ), rows)
+
+
+def outcome_status(result, error):
+    """TradingView status text for one fan-out outcome ('Success' or 'Failed: ...')"""
+    if error is not None:
+        return f"Failed: {error}"
+    return (result or {}).get('status', 'Failed')
+
+
+def is_outage(result, error):
+    """True when an outcome failed because TradingView or our login to it is down"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return True
+    return outcome_status(result, error).startswith(OUTAGE_STATUSES)
+
+
+def first_outage(outcomes):
+    """Index of the first outcome that hit an outage, or None if the whole batch can be checkpointed"""
+    for index, (row, result, error) in enumerate(outcomes):
+        if is_outage(result, error):
+            return index
+    if circuit_breaker.state != 'closed':
+        # The failures that just opened the circuit are the outage itself
+        for index, (row, result, error) in enumerate(outcomes):
+            if outcome_status(result, error) != 'Success':
+                return index
+    return None
+
+
+@job_handler('grant_script')
+def grant_script_to_subscribers(job, params):
+    """Grant one Pine Script to every user with a TradingView username who does not hold it yet"""
+    script = db.session.get(PineScript, params['script_id'])
+    if script is None:
+        raise ValueError("Pine Script not found")
+    script_id, pine_id = script.id, script.pine_id
+
+    pending = db.select(User.id, User.tradingview_username).where(
+        User.tradingview_username.isnot(None),
+        User.tradingview_username != '',
+        ~db.exists().where(UserAccess.user_id == User.id, UserAccess.pine_script_id == script_id)
+    )
+    if job.total is None:
+        job.total = db.session.scalar(db.select(db.func.count()).select_from(pending.subquery()))
+        db.session.commit()
+
+    tv_api = get_tv_api()
+    details = f"Bulk grant job #{job.id} by admin: {job.created_by}"
+
+    def fetch_batch(after_id, limit):
+        return db.session.execute(pending.where(User.id > after_id).order_by(User.id).limit(limit)).all()
+
+    def call(row):
+        results = tv_api.grant_access(row.tradingview_username, [pine_id])
+        return results[0] if results else {'status': NOT_AUTHENTICATED}
+
+    def record(outcomes):
+        now = datetime.utcnow()
+        granted = [row for row, result, error in outcomes if outcome_status(result, error) == 'Success']
+        if granted:
+            insert_missing_accesses([{
+                'user_id': row.id,
+                'pine_script_id': script_id,
+                'tradingview_username': row.tradingview_username,
+                'granted_at': now
+            } for row in granted])
+            User.query.filter(User.id.in_([row.id for row in granted])).update(
+                {User.has_generated_access: True, User.updated_at: now}, synchronize_session=False)
+            principal_cache.invalidate_on_commit(row.id for row in granted)
+        db.session.execute(db.insert(AccessLog.__table__), [{
+            'user_id': row.id,
+            'username': row.tradingview_username,
+            'action': 'grant',
+            'pine_script_id': pine_id,
+            'status': 'success' if outcome_status(result, error) == 'Success' else 'failed',
+            'details': f"{details}. API Response: {outcome_status(result, error)}",
+            'timestamp': now
+        } for row, result, error in outcomes])
+        return len(granted)
+
+    process_in_batches(job, fetch_batch, call, record)
+
+
+@job_handler('revoke_script')
+def revoke_script_and_delete(job, params):
+    """Revoke one Pine Script from every holder on TradingView, then delete it
+
+    Holders whose revocation failed keep their UserAccess row and the script
+    is kept (inactive), so deleting it again retries just those holders.
+    """
+    script = db.session.get(PineScript, params['script_id'])
+    if script is None:
+        return
+    script_id, pine_id = script.id, script.pine_id
+
+    holders = db.select(UserAccess.id, UserAccess.user_id, UserAccess.tradingview_username).where(
+        UserAccess.pine_script_id == script_id)
+    if job.total is None:
+        job.total = db.session.scalar(db.select(db.func.count()).select_from(holders.subquery()))
+        db.session.commit()
+
+    tv_api = get_tv_api()
+    details = f"Script deleted by admin: {job.created_by} (bulk revoke job #{job.id})"
+
+    def fetch_batch(after_id, limit):
+        return db.session.execute(holders.where(UserAccess.id > after_id).order_by(UserAccess.id).limit(limit)).all()
+
+    def call(row):
+        results = tv_api.remove_access(row.tradingview_username, [pine_id])
+        return results[0] if results else {'status': NOT_AUTHENTICATED}
+
+    def record(outcomes):
+        now = datetime.utcnow()
+        revoked = [row for row, result, error in outcomes if outcome_status(result, error) == 'Success']
+        if revoked:
+            UserAccess.query.filter(UserAccess.id.in_([row.id for row in revoked])).\
+                delete(synchronize_session=False)
+            user_ids = {row.user_id for row in revoked}
+            # Removed rows leave no timestamp; bump the owners so /admin/changes sees new counts
+            User.query.filter(User.id.in_(user_ids)).update({User.updated_at: now}, synchronize_session=False)
+            PineScript.query.filter_by(id=script_id).update({PineScript.updated_at: now}, synchronize_session=False)
+            principal_cache.invalidate_on_commit(user_ids)
+        db.session.execute(db.insert(AccessLog.__table__), [{
+            'user_id': row.user_id,
+            'username': row.tradingview_username,
+            'action': 'remove',
+            'pine_script_id': pine_id,
+            'status': 'success' if outcome_status(result, error) == 'Success' else 'failed',
+            'details': f"{details}. API Response: {outcome_status(result, error)}",
+            'timestamp': now
+        } for row, result, error in outcomes])
+        return len(revoked)
+
+    process_in_batches(job, fetch_batch, call, record)
+
+    remaining = db.session.scalar(db.select(db.func.count()).select_from(holders.subquery()))
+    if remaining:
+        raise RuntimeError(f"{remaining} holder(s) could not be revoked; the script was kept (inactive), "
+                           f"delete it again to retry them")
+    PineScript.query.filter_by(id=script_id).delete(synchronize_session=False)
+    db.session.commit()
+    pine_catalog.invalidate()
+
+
+@job_handler('migrate_script')
+def migrate_script_holders(job, params):
+    """Move every holder of one Pine Script to another: grant the new pine_id, then revoke the old
+
+    The old script is only revoked once the new one is granted, so a failure
+    never leaves a user with neither. A row counts as succeeded once its grant
+    landed and is committed whatever the revoke did; users left holding both
+    are retried by resuming the job, which starts over with its counters reset.
+    """
+    source = db.session.get(PineScript, params['from_script_id'])
+    target = db.session.get(PineScript, params['to_script_id'])
+    if source is None or target is None:
+        raise ValueError("Pine Script not found")
+    source_id, old_pine_id = source.id, source.pine_id
+    target_id, new_pine_id = target.id, target.pine_id
+    if source.active or not target.active:
+        # New subscribers should get the republished script from now on
+        source.active, target.active = False, True
+        db.session.commit()
+        pine_catalog.invalidate()
+
+    holders = db.select(UserAccess.id, UserAccess.user_id, UserAccess.tradingview_username).where(
+        UserAccess.pine_script_id == source_id)
+    if job.total is None:
+        job.total = db.session.scalar(db.select(db.func.count()).select_from(holders.subquery()))
+        db.session.commit()
+
+    tv_api = get_tv_api()
+    details = f"Migrated from {old_pine_id} to {new_pine_id} by admin: {job.created_by} (bulk job #{job.id})"
+
+    def fetch_batch(after_id, limit):
+        rows = db.session.execute(holders.where(UserAccess.id > after_id).order_by(UserAccess.id).limit(limit)).all()
+        holding_target = {user_id for (user_id,) in db.session.execute(db.select(UserAccess.user_id).where(
+            UserAccess.pine_script_id == target_id, UserAccess.user_id.in_([row.user_id for row in rows])))}
+        return [(row.id, row.user_id, row.tradingview_username, row.user_id in holding_target) for row in rows]
+
+    def call(row):
+        access_id, user_id, username, has_target = row
+        granted = None
+        if not has_target:
+            results = tv_api.grant_access(username, [new_pine_id])
+            granted = results[0] if results else {'status': NOT_AUTHENTICATED}
+            if granted.get('status') != 'Success':
+                return {'status': granted.get('status'), 'grant': granted, 'revoke': None}
+        results = tv_api.remove_access(username, [old_pine_id])
+        revoked = results[0] if results else {'status': NOT_AUTHENTICATED}
+        # The row's status is its grant's, or its revoke's when the new script was already held
+        return {'status': (granted or revoked).get('status'), 'grant': granted, 'revoke': revoked}
+
+    def record(outcomes):
+        now = datetime.utcnow()
+        new_accesses, revoked_ids, user_ids, logs = [], [], set(), []
+        for (access_id, user_id, username, has_target), result, error in outcomes:
+            # grant is None when the user already held the new script; revoke when the grant failed
+            grant = None if result and result['grant'] is None else outcome_status((result or {}).get('grant'), error)
+            revoke = outcome_status(result['revoke'], None) if result and result['revoke'] else None
+            if grant == 'Success':
+                new_accesses.append({'user_id': user_id, 'pine_script_id': target_id,
+                                     'tradingview_username': username, 'granted_at': now})
+                user_ids.add(user_id)
+            if revoke == 'Success':
+                revoked_ids.append(access_id)
+                user_ids.add(user_id)
+            if grant is not None:
+                logs.append({'user_id': user_id, 'username': username, 'action': 'grant', 'pine_script_id': new_pine_id,
+                             'status': 'success' if grant == 'Success' else 'failed',
+                             'details': f"{details}. API Response: {grant}", 'timestamp': now})
+            if revoke is not None:
+                logs.append({'user_id': user_id, 'username': username, 'action': 'remove', 'pine_script_id': old_pine_id,
+                             'status': 'success' if revoke == 'Success' else 'failed',
+                             'details': f"{details}. API Response: {revoke}", 'timestamp': now})
+
+        # One transaction per batch: new grants, removed old rows, logs and the checkpoint.
+        # Grants commit even when the revoke after them failed: TradingView already has them
+        insert_missing_accesses(new_accesses)
+        if revoked_ids:
+            UserAccess.query.filter(UserAccess.id.in_(revoked_ids)).delete(synchronize_session=False)
+            PineScript.query.filter_by(id=source_id).update({PineScript.updated_at: now}, synchronize_session=False)
+        if user_ids:
+            User.query.filter(User.id.in_(user_ids)).update({User.updated_at: now}, synchronize_session=False)
+            principal_cache.invalidate_on_commit(user_ids)
+        if logs:
+            db.session.execute(db.insert(AccessLog.__table__), logs)
+        return sum(1 for row, result, error in outcomes if outcome_status(result, error) == 'Success')
+
+    process_in_batches(job, fetch_batch, call, record)
+
+    remaining = db.session.scalar(db.select(db.func.count()).select_from(holders.subquery()))
+    if remaining:
+        # Start over so a resume retries them: revokes only for those already granted the new script.
+        # The counters restart too, so the resumed run reports progress over just those holders
+        logger.info(f"Bulk job {job.id}: {job.succeeded} migrated, {remaining} left holding the old script")
+        job.cursor = 0
+        job.total = remaining
+        job.processed = job.succeeded = job.failed = 0
+        db.session.commit()
+        raise RuntimeError(f"{remaining} holder(s) still hold the old script; resume the job to retry them")
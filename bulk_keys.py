@@ -0,0 +1,99 @@
+"""
+Bulk access-key issuing
+Parses a CSV of names and emails, generates collision-free key codes in
+memory and inserts them with one batched INSERT per chunk, instead of one
+uniqueness SELECT and commit per key
+"""
+
+import csv
+import io
+import logging
+import re
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import AccessKey
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MAX_ATTEMPTS = 3
+
+
+def parse_key_requests(text):
+    """Parse "name,email" CSV text (header row optional)
+
+    Returns (entries, errors): entries are {'user_name', 'user_email'} dicts,
+    errors are human-readable messages with the CSV line number.
+    """
+    entries, errors = [], []
+    reader = csv.reader(io.StringIO(text.lstrip('\ufeff')))
+    for line_number, row in enumerate(reader, start=1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if line_number == 1 and [cell.lower() for cell in cells[:2]] in (['name', 'email'], ['user_name', 'user_email']):
+            continue
+        if len(cells) < 2 or not cells[0] or not cells[1]:
+            errors.append(f"Line {line_number}: expected name and email")
+        elif not EMAIL_PATTERN.match(cells[1]):
+            errors.append(f"Line {line_number}: invalid email '{cells[1]}'")
+        else:
+            entries.append({'user_name': cells[0][:100], 'user_email': cells[1][:120]})
+    return entries, errors
+
+
+def generate_unique_codes(count):
+    """Generate `count` new key codes, distinct from each other and from the database"""
+    codes = set()
+    while len(codes) < count:
+        candidates = set()
+        while len(codes) + len(candidates) < count:
+            code = AccessKey.generate_key()
+            if code not in codes:
+                candidates.add(code)
+        taken = {code for (code,) in db.session.query(AccessKey.key_code).
+                 filter(AccessKey.key_code.in_(candidates)).all()}
+        codes |= candidates - taken
+    return list(codes)
+
+
+def issue_keys(entries, batch_size=1000):
+    """Create one active key per entry; returns entries with their 'key_code' added
+
+    Each batch is one INSERT, all in one transaction with a single commit, so a
+    failed import leaves no keys behind that the admin never received. An
+    import that hits a key created concurrently is retried with fresh codes.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        issued = []
+        try:
+            for start in range(0, len(entries), batch_size):
+                batch = entries[start:start + batch_size]
+                now = datetime.utcnow()
+                rows = [dict(entry, key_code=code, status='active', created_by_admin=True, created_at=now)
+                        for entry, code in zip(batch, generate_unique_codes(len(batch)))]
+                db.session.execute(db.insert(AccessKey.__table__), rows)
+                issued.extend(rows)
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            logger.warning("Key code collision during bulk insert, retrying the import")
+    logger.info(f"Issued {len(issued)} access keys in bulk")
+    return issued
+
+
+def iter_issued_csv(issued):
+    """Yield the issued keys as CSV text, one line at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', 'email', 'key_code'])
+    for row in issued:
+        writer.writerow([row['user_name'], row['user_email'], row['key_code']])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
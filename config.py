@@ -14,14 +14,97 @@ class Config:
     # Session configuration
     SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))  # 1 hour default
     
+    # Shared TradingView session store (database-backed, used by all workers)
+    TV_SESSION_CACHE_TTL = int(os.getenv("TV_SESSION_CACHE_TTL", "5"))  # seconds
+    TV_LOGIN_LEASE_SECONDS = int(os.getenv("TV_LOGIN_LEASE_SECONDS", "30"))
+    
+    # Background session refresh (renew the login before it expires, off the request path)
+    TV_BACKGROUND_REFRESH = os.getenv("TV_BACKGROUND_REFRESH", "true").lower() == "true"
+    TV_REFRESH_INTERVAL = int(os.getenv("TV_REFRESH_INTERVAL", "60"))  # seconds between checks
+    TV_REFRESH_BEFORE_EXPIRY = int(os.getenv("TV_REFRESH_BEFORE_EXPIRY", "3600"))  # renew this long before expiry
+    TV_SESSION_MAX_AGE = int(os.getenv("TV_SESSION_MAX_AGE", "43200"))  # renew sessions older than this
+    TV_SESSION_VERIFY_INTERVAL = int(os.getenv("TV_SESSION_VERIFY_INTERVAL", "300"))  # skip re-checks within this
+    TV_REFRESH_IDLE_SECONDS = int(os.getenv("TV_REFRESH_IDLE_SECONDS", "10"))  # idle time before refreshing
+    
     # API configuration
-    TRADINGVIEW_BASE_URL = "https://www.tradingview.com"
+    TRADINGVIEW_BASE_URL = os.getenv("TRADINGVIEW_BASE_URL", "https://www.tradingview.com")  # point at `loadtest.py standin` for load tests
+    TV_HTTP_POOL_SIZE = int(os.getenv("TV_HTTP_POOL_SIZE", "100"))  # pooled connections to TradingView
+    
+    # Time budgets: every TradingView-bound request must finish well inside gunicorn's worker timeout
+    REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "45"))  # seconds per request for upstream calls
+    TV_CALL_TIMEOUT = float(os.getenv("TV_CALL_TIMEOUT", "15"))  # cap per HTTP attempt
+    TV_MIN_CALL_BUDGET = float(os.getenv("TV_MIN_CALL_BUDGET", "3"))  # smallest share given to one sub-call
+    
+    # Retries and circuit breaker for TradingView calls
+    TV_RETRY_ATTEMPTS = int(os.getenv("TV_RETRY_ATTEMPTS", "3"))  # total attempts per call
+    TV_RETRY_BASE_DELAY = float(os.getenv("TV_RETRY_BASE_DELAY", "0.5"))  # seconds, doubled per retry (with jitter)
+    TV_RETRY_MAX_DELAY = float(os.getenv("TV_RETRY_MAX_DELAY", "8"))
+    TV_BREAKER_THRESHOLD = int(os.getenv("TV_BREAKER_THRESHOLD", "5"))  # consecutive failures before opening
+    TV_BREAKER_RESET_TIMEOUT = int(os.getenv("TV_BREAKER_RESET_TIMEOUT", "30"))  # seconds before a trial call
+    
+    # Outgoing TradingView request budget, per worker process (0 disables the limit)
+    TV_RATE_LIMIT = float(os.getenv("TV_RATE_LIMIT", "5"))  # requests per second
+    TV_RATE_BURST = int(os.getenv("TV_RATE_BURST", "5"))  # requests allowed back to back
+    
+    # Background bulk jobs (fan-out grants to every subscriber)
+    BULK_JOB_CONCURRENCY = int(os.getenv("BULK_JOB_CONCURRENCY", "8"))  # TradingView calls in flight per job
+    BULK_JOB_BATCH_SIZE = int(os.getenv("BULK_JOB_BATCH_SIZE", "100"))  # users per checkpoint
+    BULK_JOB_STALE_SECONDS = int(os.getenv("BULK_JOB_STALE_SECONDS", "300"))  # a running job silent this long has crashed
+    
+    # Seconds a completed grant/remove is replayed for a repeated Idempotency-Key
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    
+    # Database connection pool (PostgreSQL)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
     
     # Default Pine IDs (can be configured via environment)
     DEFAULT_PINE_IDS = os.getenv("DEFAULT_PINE_IDS", "").split(",") if os.getenv("DEFAULT_PINE_IDS") else []
     
+    # Startup configuration
+    # 'lazy' leaves schema creation, backup and admin bootstrap to `python data_manager.py init`;
+    # 'eager' runs them every time the app is imported (legacy behaviour)
+    STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+    
+    # Backup configuration
+    # 'native' uses the SQLite backup API / PostgreSQL COPY, 'json' forces the portable export
+    BACKUP_FORMAT = os.getenv("BACKUP_FORMAT", "native")
+    
+    # Backup retention (grandfather-father-son): newest backup per hour/day/week
+    BACKUP_KEEP_HOURLY = int(os.getenv("BACKUP_KEEP_HOURLY", "24"))
+    BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+    BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+    
+    # Largest CSV accepted by /admin/bulk-create-keys
+    BULK_KEYS_MAX_ROWS = int(os.getenv("BULK_KEYS_MAX_ROWS", "10000"))
+    # Checked before the body is read; rows are at most ~220 characters plus upload overhead
+    BULK_KEYS_MAX_BYTES = int(os.getenv("BULK_KEYS_MAX_BYTES", str(BULK_KEYS_MAX_ROWS * 256 + 65536)))
+    
+    # Seconds a logged-in user's record is reused without a SELECT (0 disables the cache)
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+    
+    # Seconds another worker may serve the /api/pine-scripts catalogue after an admin change
+    PINE_SCRIPTS_CACHE_TTL = int(os.getenv("PINE_SCRIPTS_CACHE_TTL", "60"))
+    
+    # Health check configuration
+    HEALTH_CACHE_TTL = int(os.getenv("HEALTH_CACHE_TTL", "30"))  # seconds
+    HEALTH_APPROXIMATE_COUNTS = os.getenv("HEALTH_APPROXIMATE_COUNTS", "false").lower() == "true"
+    
+    # Statements slower than this are logged with the route that issued them
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+    
+    # Admin request profiling: newest PROFILE_KEEP profiles are kept in PROFILE_DIR
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+    
+    # Metrics: /metrics is admin-only; scrapers may instead send "Authorization: Bearer <METRICS_TOKEN>"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    
     # Logging configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+    LOG_DEBUG_SAMPLE_BURST = int(os.getenv("LOG_DEBUG_SAMPLE_BURST", "5"))  # DEBUG records per call site per interval (0 = no sampling)
+    LOG_DEBUG_SAMPLE_INTERVAL = int(os.getenv("LOG_DEBUG_SAMPLE_INTERVAL", "60"))  # seconds
     
     @staticmethod
     def validate():
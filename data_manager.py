@@ -15,10 +15,16 @@ def main():
     parser = argparse.ArgumentParser(description='TradingView Access Manager - Database Management')
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
+    # Setup commands
+    init_parser = subparsers.add_parser('init', help='Create tables and default admin (one-time setup)')
+    init_parser.add_argument('--skip-backup', action='store_true', help='Do not take a backup')
+    
     # Backup commands
     backup_parser = subparsers.add_parser('backup', help='Create database backup')
     backup_parser.add_argument('--name', help='Backup name (optional)')
     backup_parser.add_argument('--auto', action='store_true', help='Create automatic backup')
+    backup_parser.add_argument('--format', choices=['native', 'json'], default=None,
+                               help='native: engine snapshot (SQLite backup API / PostgreSQL COPY); json: portable export')
     
     # Restore commands
     restore_parser = subparsers.add_parser('restore', help='Restore from backup')
@@ -27,14 +33,48 @@ def main():
     # List commands
     list_parser = subparsers.add_parser('list', help='List available backups')
     
+    # Cleanup commands
+    cleanup_parser = subparsers.add_parser('cleanup', help='Prune backups with tiered retention')
+    cleanup_parser.add_argument('--hourly', type=int, help='Hourly backups to keep')
+    cleanup_parser.add_argument('--daily', type=int, help='Daily backups to keep')
+    cleanup_parser.add_argument('--weekly', type=int, help='Weekly backups to keep')
+    cleanup_parser.add_argument('--dry-run', action='store_true', help='Only show what would be removed')
+    
     # Health commands
     health_parser = subparsers.add_parser('health', help='Check database health')
+    health_parser.add_argument('--approximate', action='store_true',
+                               help='Use planner row estimates instead of exact counts (PostgreSQL)')
     
     # Recovery commands
     recovery_parser = subparsers.add_parser('recover', help='Run data recovery')
     recovery_parser.add_argument('--validate', action='store_true', help='Validate data integrity')
     recovery_parser.add_argument('--defaults', action='store_true', help='Recover default data')
     recovery_parser.add_argument('--full', action='store_true', help='Run full recovery')
+    recovery_parser.add_argument('--dry-run', action='store_true', help='With --validate, only report issues')
+    
+    # Bulk key import
+    import_parser = subparsers.add_parser('import-keys', help='Create access keys from a CSV of names and emails')
+    import_parser.add_argument('file', help='CSV file with name,email rows (header optional)')
+    import_parser.add_argument('--output', help='Write the issued keys as CSV here (default: stdout)')
+    
+    # Background bulk jobs (also started from the admin dashboard)
+    jobs_parser = subparsers.add_parser('jobs', help='List, start or resume bulk TradingView jobs')
+    jobs_parser.add_argument('--grant-script', type=int, metavar='SCRIPT_ID',
+                             help='Grant a Pine Script to every user with a TradingView username')
+    jobs_parser.add_argument('--migrate-script', type=int, nargs=2, metavar=('FROM_ID', 'TO_ID'),
+                             help='Move every holder of one Pine Script to another (grant new, revoke old)')
+    jobs_parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Resume a failed, cancelled or crashed job')
+    
+    # Synthetic data for performance testing
+    generate_parser = subparsers.add_parser('generate', help='Fill the database with synthetic data for load testing')
+    generate_parser.add_argument('--keys', type=int, default=50000, help='Access keys to create')
+    generate_parser.add_argument('--users', type=int, help='Users to create (default: half of --keys)')
+    generate_parser.add_argument('--accesses', type=int, default=200000, help='UserAccess rows to create')
+    generate_parser.add_argument('--logs', type=int, default=1000000, help='AccessLog rows to create')
+    generate_parser.add_argument('--scripts', type=int, default=20, help='Pine scripts to create')
+    generate_parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT batch')
+    generate_parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+    generate_parser.add_argument('--purge', action='store_true', help='Delete all synthetic data instead')
     
     args = parser.parse_args()
     
@@ -47,11 +87,16 @@ def main():
     recovery = DataRecovery()
     
     try:
-        if args.command == 'backup':
+        if args.command == 'init':
+            from app import app, init_database
+            init_database(app, backup=not args.skip_backup)
+            print(f"✅ Database initialized ({app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]})")
+        
+        elif args.command == 'backup':
             if args.auto:
                 backup_file = backup_manager.auto_backup()
             else:
-                backup_file = backup_manager.create_backup(args.name)
+                backup_file = backup_manager.create_backup(args.name, args.format)
             
             if backup_file:
                 print(f"✅ Backup created: {os.path.basename(backup_file)}")
@@ -60,9 +105,7 @@ def main():
                 sys.exit(1)
         
         elif args.command == 'restore':
-            backup_file = args.file
-            if not backup_file.endswith('.json'):
-                backup_file = os.path.join(backup_manager.backup_dir, f"{backup_file}.json")
+            backup_file = backup_manager.resolve_backup_file(args.file)
             
             if backup_manager.restore_backup(backup_file):
                 print("✅ Restore completed successfully")
@@ -75,15 +118,25 @@ def main():
             if not backups:
                 print("No backups found")
             else:
-                print(f"{'Name':<40} {'Size':<10} {'Date':<20}")
-                print("-" * 70)
+                print(f"{'Name':<40} {'Kind':<7} {'Format':<8} {'Size':<10} {'Date':<20}")
+                print("-" * 87)
                 for backup in backups:
                     size_mb = backup['size'] / (1024 * 1024)
                     date_str = backup['modified'].strftime('%Y-%m-%d %H:%M:%S')
-                    print(f"{backup['name']:<40} {size_mb:.2f}MB{'':<3} {date_str}")
+                    print(f"{backup['name']:<40} {backup['kind']:<7} {backup['format']:<8} {size_mb:.2f}MB{'':<3} {date_str}")
+        
+        elif args.command == 'cleanup':
+            removed = backup_manager.cleanup_old_backups(args.hourly, args.daily, args.weekly, dry_run=args.dry_run)
+            verb = 'Would remove' if args.dry_run else 'Removed'
+            if not removed:
+                print("✅ No backups to remove")
+            else:
+                print(f"{verb} {len(removed)} backup(s):")
+                for name in removed:
+                    print(f"  - {name}")
         
         elif args.command == 'health':
-            health = recovery.check_database_health()
+            health = recovery.check_database_health(use_cache=False, approximate=args.approximate)
             print("Database Health Report")
             print("=" * 50)
             print(f"Timestamp: {health['timestamp']}")
@@ -91,7 +144,7 @@ def main():
             print(f"Tables exist: {'✅' if health['tables_exist'] else '❌'}")
             
             if health['data_counts']:
-                print("\nData Counts:")
+                print("\nData Counts (approximate):" if health['approximate_counts'] else "\nData Counts:")
                 for table, count in health['data_counts'].items():
                     print(f"  {table}: {count}")
             
@@ -106,12 +159,82 @@ def main():
             else:
                 print("\n✅ No issues found")
         
+        elif args.command == 'import-keys':
+            from app import app
+            import bulk_keys
+            with open(args.file, encoding='utf-8-sig') as f:
+                entries, errors = bulk_keys.parse_key_requests(f.read())
+            if errors:
+                print(f"❌ {len(errors)} invalid row(s), no keys created:")
+                for error in errors:
+                    print(f"  - {error}")
+                sys.exit(1)
+            with app.app_context():
+                issued = bulk_keys.issue_keys(entries)
+            if args.output:
+                with open(args.output, 'w', newline='') as out:
+                    out.writelines(bulk_keys.iter_issued_csv(issued))
+                print(f"✅ Created {len(issued)} access key(s), written to {args.output}")
+            else:
+                sys.stdout.writelines(bulk_keys.iter_issued_csv(issued))
+        
+        elif args.command == 'jobs':
+            from app import app
+            import bulk_jobs
+            from models import BulkJob
+            with app.app_context():
+                if args.grant_script or args.migrate_script or args.resume:
+                    if args.grant_script:
+                        job, _ = bulk_jobs.create_job('grant_script', {'script_id': args.grant_script}, created_by='data_manager')
+                        job_id = job.id
+                    elif args.migrate_script:
+                        from_id, to_id = args.migrate_script
+                        job, _ = bulk_jobs.create_job('migrate_script', {'from_script_id': from_id, 'to_script_id': to_id},
+                                                      created_by='data_manager')
+                        job_id = job.id
+                    else:
+                        job_id = args.resume
+                    # Runs in the foreground; Ctrl+C leaves the job resumable once it goes stale
+                    if not bulk_jobs.claim_job(job_id):
+                        print(f"❌ Job {job_id} not found, finished or already running")
+                        sys.exit(1)
+                    job = bulk_jobs.run_job(job_id)
+                    icon = '✅' if job.status == 'completed' else '❌'
+                    print(f"{icon} Job {job.id} {job.status}: {job.succeeded} succeeded, {job.failed} failed"
+                          f"{f' ({job.last_error})' if job.last_error else ''}")
+                else:
+                    jobs = BulkJob.query.order_by(BulkJob.id.desc()).limit(20).all()
+                    if not jobs:
+                        print("No bulk jobs")
+                    for job in jobs:
+                        payload = bulk_jobs.job_payload(job)
+                        print(f"  #{job.id} {job.kind} {job.params} {job.status} {payload['progress']}% "
+                              f"({job.succeeded} ok, {job.failed} failed){' resumable' if payload['resumable'] else ''}")
+        
+        elif args.command == 'generate':
+            from synthetic_data import SYNTHETIC_PASSWORD, generate_synthetic_data, purge_synthetic_data
+            if args.purge:
+                counts = purge_synthetic_data()
+                print("✅ Synthetic data removed:")
+            else:
+                counts = generate_synthetic_data(
+                    keys=args.keys, users=args.users, accesses=args.accesses, logs=args.logs,
+                    scripts=args.scripts, batch_size=args.batch_size, seed=args.seed, progress=print
+                )
+                print(f"✅ Synthetic data generated (user password: {SYNTHETIC_PASSWORD}):")
+            for table_name, count in counts.items():
+                print(f"  {table_name}: {count}")
+        
         elif args.command == 'recover':
             if args.full:
                 run_full_recovery()
             elif args.validate:
-                result = recovery.validate_data_integrity()
-                if result['issues_found']:
+                result = recovery.validate_data_integrity(dry_run=args.dry_run)
+                if result['issues_found'] and args.dry_run:
+                    print("Issues found (dry run, nothing changed):")
+                    for issue in result['issues_found']:
+                        print(f"  - {issue}")
+                elif result['issues_found']:
                     print("Issues found and fixed:")
                     for fix in result['fixes_applied']:
                         print(f"  ✅ {fix}")
@@ -5,83 +5,113 @@ Ensures data integrity and provides recovery options
 """
 
 import os
+import copy
 import logging
+import threading
+import time
 from datetime import datetime
+from sqlalchemy import table, column
+from sqlalchemy.orm import aliased
 from app import app, db
+from config import Config
 from models import User, AccessKey, PineScript, UserAccess, AccessLog
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL catalog used for approximate row counts
+pg_class = table('pg_class', column('oid'), column('reltuples'))
+
+# Per-process health report cache: {approximate: (expires_at, report)}
+_health_cache = {}
+_health_cache_lock = threading.Lock()
+
 class DataRecovery:
     def __init__(self):
         self.recovery_log = []
     
-    def validate_data_integrity(self):
-        """Validate database integrity and fix common issues"""
+    def validate_data_integrity(self, dry_run=False):
+        """Validate database integrity and fix common issues
+        
+        Each check is a single set-based statement (NOT EXISTS anti-join
+        plus bulk DELETE/UPDATE). With dry_run=True only the counts are
+        reported and nothing is changed.
+        """
         issues_found = []
         fixes_applied = []
         
         with app.app_context():
             try:
                 # Check for orphaned user accesses
-                orphaned_accesses = db.session.query(UserAccess).filter(
-                    ~UserAccess.user_id.in_(db.session.query(User.id))
-                ).all()
+                orphaned_user = ~db.exists().where(User.id == UserAccess.user_id)
+                orphaned_count = self._count_or_delete(UserAccess, orphaned_user, dry_run)
                 
-                if orphaned_accesses:
-                    issues_found.append(f"Found {len(orphaned_accesses)} orphaned user accesses")
-                    for access in orphaned_accesses:
-                        db.session.delete(access)
-                    fixes_applied.append(f"Removed {len(orphaned_accesses)} orphaned user accesses")
+                if orphaned_count:
+                    issues_found.append(f"Found {orphaned_count} orphaned user accesses")
+                    if not dry_run:
+                        fixes_applied.append(f"Removed {orphaned_count} orphaned user accesses")
                 
                 # Check for orphaned user accesses (pine script side)
-                orphaned_script_accesses = db.session.query(UserAccess).filter(
-                    ~UserAccess.pine_script_id.in_(db.session.query(PineScript.id))
-                ).all()
+                orphaned_script = ~db.exists().where(PineScript.id == UserAccess.pine_script_id)
+                orphaned_script_count = self._count_or_delete(UserAccess, orphaned_script, dry_run)
                 
-                if orphaned_script_accesses:
-                    issues_found.append(f"Found {len(orphaned_script_accesses)} accesses to deleted scripts")
-                    for access in orphaned_script_accesses:
-                        db.session.delete(access)
-                    fixes_applied.append(f"Removed {len(orphaned_script_accesses)} accesses to deleted scripts")
+                if orphaned_script_count:
+                    issues_found.append(f"Found {orphaned_script_count} accesses to deleted scripts")
+                    if not dry_run:
+                        fixes_applied.append(f"Removed {orphaned_script_count} accesses to deleted scripts")
                 
                 # Check for users with invalid access key references
-                invalid_key_users = db.session.query(User).filter(
+                invalid_key = db.and_(
                     User.access_key_id.isnot(None),
-                    ~User.access_key_id.in_(db.session.query(AccessKey.id))
-                ).all()
+                    ~db.exists().where(AccessKey.id == User.access_key_id)
+                )
+                invalid_key_query = db.session.query(User).filter(invalid_key)
+                if dry_run:
+                    invalid_key_count = invalid_key_query.count()
+                else:
+                    invalid_key_count = invalid_key_query.update(
+                        {User.access_key_id: None}, synchronize_session=False
+                    )
                 
-                if invalid_key_users:
-                    issues_found.append(f"Found {len(invalid_key_users)} users with invalid access key references")
-                    for user in invalid_key_users:
-                        user.access_key_id = None
-                    fixes_applied.append(f"Fixed {len(invalid_key_users)} invalid access key references")
+                if invalid_key_count:
+                    issues_found.append(f"Found {invalid_key_count} users with invalid access key references")
+                    if not dry_run:
+                        fixes_applied.append(f"Fixed {invalid_key_count} invalid access key references")
                 
-                # Check for duplicate Pine Script IDs
-                duplicate_scripts = db.session.query(PineScript.pine_id, db.func.count(PineScript.id)).\
-                    group_by(PineScript.pine_id).\
-                    having(db.func.count(PineScript.id) > 1).all()
+                # Check for duplicate Pine Script IDs (a newer row shares its pine_id with an older one)
+                older = aliased(PineScript)
+                is_duplicate = db.exists().where(
+                    older.pine_id == PineScript.pine_id,
+                    older.id < PineScript.id
+                )
+                duplicate_groups = db.session.query(db.func.count(db.distinct(PineScript.pine_id))).\
+                    filter(is_duplicate).scalar()
                 
-                if duplicate_scripts:
-                    issues_found.append(f"Found {len(duplicate_scripts)} duplicate Pine Script IDs")
-                    for pine_id, count in duplicate_scripts:
-                        # Keep the first one, delete the rest
-                        scripts = PineScript.query.filter_by(pine_id=pine_id).all()
-                        for script in scripts[1:]:
-                            # Remove associated user accesses first
-                            UserAccess.query.filter_by(pine_script_id=script.id).delete()
-                            db.session.delete(script)
-                    fixes_applied.append(f"Removed duplicate Pine Scripts, kept oldest versions")
+                if duplicate_groups:
+                    issues_found.append(f"Found {duplicate_groups} duplicate Pine Script IDs")
+                    if not dry_run:
+                        # Keep the oldest row per pine_id; remove accesses to the others first
+                        duplicate_ids = db.select(PineScript.id).where(is_duplicate)
+                        db.session.query(UserAccess).\
+                            filter(UserAccess.pine_script_id.in_(duplicate_ids)).\
+                            delete(synchronize_session=False)
+                        db.session.query(PineScript).filter(is_duplicate).delete(synchronize_session=False)
+                        fixes_applied.append(f"Removed duplicate Pine Scripts, kept oldest versions")
                 
                 # Commit all fixes
                 if fixes_applied:
                     db.session.commit()
                     logger.info("Data integrity fixes applied successfully")
                 
+                if not issues_found:
+                    status = 'success'
+                else:
+                    status = 'issues_found' if dry_run else 'fixed'
+                
                 return {
                     'issues_found': issues_found,
                     'fixes_applied': fixes_applied,
-                    'status': 'success' if not issues_found else 'fixed'
+                    'dry_run': dry_run,
+                    'status': status
                 }
                 
             except Exception as e:
@@ -90,10 +120,18 @@ class DataRecovery:
                 return {
                     'issues_found': issues_found,
                     'fixes_applied': [],
+                    'dry_run': dry_run,
                     'error': str(e),
                     'status': 'error'
                 }
     
+    def _count_or_delete(self, model, condition, dry_run):
+        """Count matching rows, or bulk delete them and return the row count"""
+        query = db.session.query(model).filter(condition)
+        if dry_run:
+            return query.count()
+        return query.delete(synchronize_session=False)
+    
     def recover_default_data(self):
         """Recover essential default data if missing"""
         recovered_items = []
@@ -155,12 +193,32 @@ class DataRecovery:
                     'status': 'error'
                 }
     
-    def check_database_health(self):
-        """Comprehensive database health check"""
+    def check_database_health(self, use_cache=True, approximate=None):
+        """Comprehensive database health check
+        
+        All counts come from one aggregate query. With approximate=True
+        (default Config.HEALTH_APPROXIMATE_COUNTS) PostgreSQL table counts
+        are read from pg_class.reltuples instead of scanning the tables.
+        Successful reports are cached per process for Config.HEALTH_CACHE_TTL
+        seconds; failed checks are never cached.
+        """
+        if approximate is None:
+            approximate = Config.HEALTH_APPROXIMATE_COUNTS
+        
+        if use_cache:
+            with _health_cache_lock:
+                cached = _health_cache.get(approximate)
+                if cached and cached[0] > time.monotonic():
+                    report = copy.deepcopy(cached[1])
+                    report['cached'] = True
+                    return report
+        
         health_report = {
             'timestamp': datetime.now().isoformat(),
             'database_accessible': False,
             'tables_exist': False,
+            'approximate_counts': False,
+            'cached': False,
             'data_counts': {},
             'issues': [],
             'recommendations': []
@@ -168,23 +226,16 @@ class DataRecovery:
         
         try:
             with app.app_context():
-                # Test database connection
-                db.session.execute(db.text('SELECT 1'))
-                health_report['database_accessible'] = True
+                use_reltuples = approximate and db.engine.dialect.name == 'postgresql'
                 
-                # Check if tables exist
                 try:
-                    user_count = User.query.count()
+                    counts = self._query_counts(use_reltuples)
+                    health_report['database_accessible'] = True
                     health_report['tables_exist'] = True
+                    health_report['approximate_counts'] = use_reltuples
                     
-                    # Get data counts
-                    health_report['data_counts'] = {
-                        'users': User.query.count(),
-                        'access_keys': AccessKey.query.count(),
-                        'pine_scripts': PineScript.query.count(),
-                        'user_accesses': UserAccess.query.count(),
-                        'access_logs': AccessLog.query.count()
-                    }
+                    admin_count = counts.pop('admins')
+                    health_report['data_counts'] = counts
                     
                     # Check for potential issues
                     if health_report['data_counts']['users'] == 0:
@@ -195,12 +246,15 @@ class DataRecovery:
                         health_report['issues'].append("No Pine Scripts found")
                         health_report['recommendations'].append("Run data recovery to create default Pine Scripts")
                     
-                    admin_count = User.query.filter_by(is_admin=True).count()
                     if admin_count == 0:
                         health_report['issues'].append("No admin users found")
                         health_report['recommendations'].append("Create an admin user to manage the system")
                     
                 except Exception as e:
+                    db.session.rollback()
+                    # Distinguish a missing schema from an unreachable database
+                    db.session.execute(db.text('SELECT 1'))
+                    health_report['database_accessible'] = True
                     health_report['issues'].append(f"Tables may not exist: {str(e)}")
                     health_report['recommendations'].append("Initialize database tables")
                 
@@ -208,7 +262,41 @@ class DataRecovery:
             health_report['issues'].append(f"Database connection failed: {str(e)}")
             health_report['recommendations'].append("Check database configuration and connectivity")
         
+        # Only cache reports that reached the tables; a failed check is retried on the next call
+        if health_report['tables_exist']:
+            with _health_cache_lock:
+                _health_cache[approximate] = (time.monotonic() + Config.HEALTH_CACHE_TTL, copy.deepcopy(health_report))
+        
         return health_report
+    
+    def _query_counts(self, use_reltuples=False):
+        """Fetch every table count plus the admin count in a single statement"""
+        models = {
+            'users': User,
+            'access_keys': AccessKey,
+            'pine_scripts': PineScript,
+            'user_accesses': UserAccess,
+            'access_logs': AccessLog
+        }
+        
+        columns = []
+        for label, model in models.items():
+            exact = db.select(db.func.count()).select_from(model).scalar_subquery()
+            if use_reltuples:
+                # reltuples is -1 until the table has been analyzed; fall back to an exact count then
+                estimate = db.select(db.cast(pg_class.c.reltuples, db.BigInteger)).where(
+                    pg_class.c.oid == db.func.to_regclass(model.__tablename__)
+                ).scalar_subquery()
+                columns.append(db.case((estimate >= 0, estimate), else_=exact).label(label))
+            else:
+                columns.append(exact.label(label))
+        
+        columns.append(
+            db.select(db.func.count()).select_from(User).where(User.is_admin.is_(True)).scalar_subquery().label('admins')
+        )
+        
+        row = db.session.execute(db.select(*columns)).one()
+        return {key: int(value or 0) for key, value in row._mapping.items()}
 
 
 def run_full_recovery():
@@ -219,7 +307,7 @@ def run_full_recovery():
     
     # Health check
     print("\n📋 Checking database health...")
-    health = recovery.check_database_health()
+    health = recovery.check_database_health(use_cache=False)
     print(f"Database accessible: {'✅' if health['database_accessible'] else '❌'}")
     print(f"Tables exist: {'✅' if health['tables_exist'] else '❌'}")
     
@@ -267,7 +355,7 @@ if __name__ == "__main__":
     
     if len(sys.argv) > 1 and sys.argv[1] == "health":
         recovery = DataRecovery()
-        health = recovery.check_database_health()
+        health = recovery.check_database_health(use_cache=False)
         print(f"Database Health Report:")
         print(f"Timestamp: {health['timestamp']}")
         print(f"Database accessible: {health['database_accessible']}")
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for TradingView Access Manager
+TradingView calls are slow upstream I/O, so workers default to gevent: every
+request runs in a greenlet and blocking socket calls (requests, psycopg2)
+yield to the worker's event loop instead of holding the process
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '500'))  # gevent: concurrent requests per worker
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))  # gthread only
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+reuse_port = True
+
+
+def post_worker_init(worker):
+    """Make psycopg2 cooperative so queries also yield to the event loop"""
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        worker.log.info("psycopg2 patched for gevent")
+    except ImportError:
+        worker.log.warning("psycogreen not installed; PostgreSQL queries will block the event loop")
@@ -0,0 +1,194 @@
+"""
+Idempotent grant/remove requests
+Duplicates of an operation that is still running in this process (double
+clicks, client retries) wait for it and get its response instead of
+repeating the TradingView calls. Requests carrying an Idempotency-Key header
+also get the stored response of an earlier successful attempt, from any
+worker, for IDEMPOTENCY_TTL seconds
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from config import Config
+from models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 100
+# Looks at a key held by another request before answering 409
+CLAIM_ATTEMPTS = 3
+
+# {fingerprint: _InFlight} for operations running in this process
+_in_flight = {}
+_lock = threading.Lock()
+
+
+class _InFlight:
+    """One running operation; duplicates wait on `done` and reuse (body, status)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def fingerprint(user_id, action, username, pine_ids=()):
+    """Hash of what a request does; duplicates match whatever the pine_id order"""
+    payload = json.dumps([user_id, action, username, sorted(set(pine_ids or ()))])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def run_once(user_id, action, username, pine_ids, func, key=None):
+    """Return func()'s JSON response unless the same operation is already running or done
+
+    Replayed responses carry an Idempotent-Replayed: true header. Only
+    successful responses are stored for the key, so retrying a failure with
+    the same key really retries it.
+    """
+    operation = fingerprint(user_id, action, username, pine_ids)
+    if key is None:
+        return _respond(*_run_deduplicated(operation, func))
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return _respond(json.dumps({'success': False, 'message': f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters'}), 400)
+
+    for attempt in range(CLAIM_ATTEMPTS):
+        state, stored = _claim_key(user_id, key, operation)
+        if state != 'in_progress':
+            break
+        with _lock:
+            call = _in_flight.get(operation)
+        if call is not None:
+            return _respond(*_wait_for(call), replayed=True)
+        if attempt < CLAIM_ATTEMPTS - 1:
+            # A leader in this process may be between claiming and registering; look again shortly
+            time.sleep(0.05 * (attempt + 1))
+    else:
+        # Running on another worker
+        return _respond(json.dumps({'success': False, 'message': 'This request is still being processed, please wait'}), 409)
+    if state == 'mismatch':
+        return _respond(json.dumps({'success': False, 'message': f'{HEADER} was already used for a different request'}), 422)
+    if state == 'completed':
+        return _respond(*stored, replayed=True)
+
+    def settle(result):
+        if result is not None and result[1] < 400 and json.loads(result[0]).get('success'):
+            _store_key(user_id, key, *result)
+        else:
+            _release_key(user_id, key)
+
+    return _respond(*_run_deduplicated(operation, func, settle))
+
+
+def _respond(body, status, replayed=False):
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _run_deduplicated(operation, func, settle=None):
+    """(body, status, replayed): run func() or wait for the identical call already in flight
+
+    settle((body, status) or None if func raised) runs before the operation
+    leaves _in_flight, so a duplicate that no longer finds it there finds its
+    idempotency record already completed or released.
+    """
+    with _lock:
+        call = _in_flight.get(operation)
+        leader = call is None
+        if leader:
+            call = _in_flight[operation] = _InFlight()
+    if not leader:
+        logger.info("Duplicate request attached to the operation already in progress")
+        result = _wait_for(call)
+        if settle:
+            settle(result)
+        return result + (True,)
+
+    try:
+        response = func()
+        response = response if not isinstance(response, tuple) else current_app.make_response(response)
+        call.result = (response.get_data(as_text=True), response.status_code)
+        return call.result + (False,)
+    finally:
+        try:
+            if settle:
+                settle(call.result)
+        finally:
+            with _lock:
+                _in_flight.pop(operation, None)
+            call.done.set()
+
+
+def _wait_for(call):
+    # Upstream calls are bounded by REQUEST_DEADLINE; allow a little for the DB writes after them
+    if not call.done.wait(Config.REQUEST_DEADLINE + 15):
+        return json.dumps({'success': False, 'message': 'This request is still being processed, please wait'}), 409
+    if call.result is None:
+        return json.dumps({'success': False, 'message': 'The original request failed, please try again'}), 500
+    return call.result
+
+
+def _claim_key(user_id, key, operation):
+    """('claimed' | 'completed' | 'in_progress' | 'mismatch', stored (body, status) or None)
+
+    Runs on its own connection so it never commits or rolls back the request's session.
+    """
+    table = IdempotencyRecord.__table__
+    now = datetime.utcnow()
+    expired_before = now - timedelta(seconds=Config.IDEMPOTENCY_TTL)
+    # An attempt this old was abandoned by a worker that died
+    abandoned_before = now - timedelta(seconds=2 * Config.REQUEST_DEADLINE)
+
+    # Its own transaction: the INSERT below failing must not roll the cleanup back
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.user_id == user_id, table.c.created_at < expired_before))
+    for attempt in range(2):
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(
+                    user_id=user_id, key=key, fingerprint=operation, status='in_progress', created_at=now))
+            return 'claimed', None
+        except IntegrityError:
+            pass
+        with db.engine.begin() as conn:
+            row = conn.execute(db.select(table).where(table.c.user_id == user_id, table.c.key == key)).first()
+        if row is not None:
+            break
+        # Released between our INSERT and SELECT: claim it again
+    else:
+        return 'in_progress', None
+
+    expired = row.created_at < expired_before
+    if not expired and row.fingerprint != operation:
+        return 'mismatch', None
+    if expired or (row.status == 'in_progress' and row.created_at < abandoned_before):
+        with db.engine.begin() as conn:
+            taken = conn.execute(table.update().where(table.c.id == row.id, table.c.created_at == row.created_at).
+                                 values(fingerprint=operation, status='in_progress', response_status=None,
+                                        response_body=None, created_at=now)).rowcount
+        return ('claimed', None) if taken else ('in_progress', None)
+    if row.status == 'completed':
+        return 'completed', (row.response_body, row.response_status)
+    return 'in_progress', None
+
+
+def _store_key(user_id, key, body, status):
+    table = IdempotencyRecord.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.user_id == user_id, table.c.key == key).
+                     values(status='completed', response_status=status, response_body=body))
+
+
+def _release_key(user_id, key):
+    table = IdempotencyRecord.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(
+            table.c.user_id == user_id, table.c.key == key, table.c.status == 'in_progress'))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Load-test harness
+Runs a local TradingView stand-in and drives the main user and admin routes
+with concurrent virtual users, reporting throughput and p50/p95/p99 latency
+per route.
+
+Typical run against synthetic data (see `data_manager.py generate`):
+
+    python loadtest.py standin --port 8765
+    TRADINGVIEW_BASE_URL=http://127.0.0.1:8765 TRADINGVIEW_USERNAME=x TRADINGVIEW_PASSWORD=x \\
+        gunicorn -c gunicorn.conf.py main:app
+    python loadtest.py run --target http://127.0.0.1:8000 --users 50 --duration 60
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+
+# Must match synthetic_data.py (not imported so the harness runs without the app's settings)
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.example.com'
+SYNTHETIC_PASSWORD = 'loadtest123'
+ADMIN_ACCESS_CODE = 'ACCESS123'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers the TradingView endpoints tradingview.py calls, with injectable latency and errors"""
+
+    latency = 0.05  # seconds per call
+    error_rate = 0.0  # fraction of pine_perm calls answered with HTTP 503
+    grants = defaultdict(set)  # {pine_id: usernames}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='application/json', cookies=()):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for cookie in cookies:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        if url.path == '/accounts/signin/':
+            self._reply(200, b'<script>window._csrf = "standin-csrf"</script>', 'text/html')
+        elif url.path == '/chart/':
+            self._reply(200, b'<script>window.__csrfToken = "standin-csrf"</script>', 'text/html')
+        elif url.path == '/username_hint/':
+            name = parse_qs(url.query).get('s', [''])[0]
+            self._reply(200, [{'username': name}] if name else [])
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        form = self._form()
+        if url.path == '/accounts/signin/':
+            expires = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 86400 * 30))
+            self._reply(200, {'user': {'username': form.get('username') or 'standin'}},
+                        cookies=[f'sessionid=standin{random.getrandbits(32)}; Path=/; Expires={expires}'])
+            return
+        if url.path.startswith('/pine_perm/') and random.random() < self.error_rate:
+            self._reply(503, {'error': 'injected failure'})
+            return
+
+        pine_id, username = form.get('pine_id'), form.get('username_recip', '')
+        if url.path == '/pine_perm/add/':
+            with self.lock:
+                self.grants[pine_id].add(username)
+            self._reply(201, {'status': 'ok'})
+        elif url.path == '/pine_perm/remove/':
+            with self.lock:
+                self.grants[pine_id].discard(username)
+            self._reply(200, {'status': 'ok'})
+        elif url.path == '/pine_perm/list_users/':
+            with self.lock:
+                holders = sorted(self.grants[pine_id])
+            self._reply(200, {'results': [{'username': name, 'expiration': None} for name in holders]})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+def run_standin(port, latency, error_rate):
+    StandInHandler.latency = latency
+    StandInHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    print(f"TradingView stand-in listening on http://127.0.0.1:{port} "
+          f"(latency {latency * 1000:.0f}ms, error rate {error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+class Recorder:
+    """Thread-safe latency samples per route"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def timed(self, route, session, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+        return response
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def user_scenario(target, index, recorder, stop_at, scripts):
+    """One subscriber: validate a key, log in, open /manage, grant then remove access"""
+    session = requests.Session()
+    email = f'user{index}@{SYNTHETIC_EMAIL_DOMAIN}'
+    username = f'syn_trader_{index}'
+    while time.monotonic() < stop_at:
+        recorder.timed('/validate-key', session, 'post', f'{target}/validate-key',
+                       data={'key_code': f'SYN{random.randrange(100000):013d}'}, allow_redirects=False)
+        recorder.timed('/login', session, 'post', f'{target}/login',
+                       data={'email': email, 'password': SYNTHETIC_PASSWORD}, allow_redirects=False)
+        recorder.timed('/manage', session, 'get', f'{target}/manage', allow_redirects=False)
+        if scripts:
+            chosen = random.sample(scripts, min(len(scripts), random.randint(1, 3)))
+            recorder.timed('/api/grant-access', session, 'post', f'{target}/api/grant-access',
+                           json={'username': username, 'pine_script_ids': chosen})
+            recorder.timed('/api/remove-access', session, 'post', f'{target}/api/remove-access',
+                           json={'username': username})
+
+
+def admin_scenario(target, recorder, stop_at):
+    """One admin repeatedly loading the dashboard"""
+    session = requests.Session()
+    session.post(f'{target}/admin/login', data={'access_code': ADMIN_ACCESS_CODE})
+    while time.monotonic() < stop_at:
+        recorder.timed('/admin', session, 'get', f'{target}/admin', allow_redirects=False)
+
+
+def run_load(target, users, admins, duration, user_offset):
+    recorder = Recorder()
+    session = requests.Session()
+    scripts = []
+    response = session.post(f'{target}/admin/login', data={'access_code': ADMIN_ACCESS_CODE})
+    if response.ok:
+        listing = session.get(f'{target}/admin/pine-scripts').json()
+        scripts = [s['pine_id'] for s in listing.get('scripts', []) if s['active']]
+
+    stop_at = time.monotonic() + duration
+    threads = [threading.Thread(target=user_scenario, args=(target, user_offset + i, recorder, stop_at, scripts))
+               for i in range(users)]
+    threads += [threading.Thread(target=admin_scenario, args=(target, recorder, stop_at)) for _ in range(admins)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"\nLoad test: {users} users + {admins} admins for {elapsed:.1f}s against {target}")
+    print(f"{'Route':<22} {'Requests':>9} {'Errors':>7} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print("-" * 76)
+    for route, values in sorted(recorder.samples.items()):
+        print(f"{route:<22} {len(values):>9} {recorder.errors[route]:>7} {len(values) / elapsed:>8.1f} "
+              f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TradingView Access Manager - Load Testing')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    standin_parser = subparsers.add_parser('standin', help='Run the local TradingView stand-in')
+    standin_parser.add_argument('--port', type=int, default=8765)
+    standin_parser.add_argument('--latency', type=float, default=50, help='Milliseconds per call')
+    standin_parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of pine_perm calls that fail')
+
+    run_parser = subparsers.add_parser('run', help='Drive the app and report latency per route')
+    run_parser.add_argument('--target', default='http://127.0.0.1:5000', help='Base URL of the running app')
+    run_parser.add_argument('--users', type=int, default=20, help='Concurrent subscriber sessions')
+    run_parser.add_argument('--admins', type=int, default=1, help='Concurrent admin sessions')
+    run_parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    run_parser.add_argument('--user-offset', type=int, default=0, help='First synthetic user number to log in as')
+
+    args = parser.parse_args()
+    if args.command == 'standin':
+        run_standin(args.port, args.latency / 1000, args.error_rate)
+    elif args.command == 'run':
+        run_load(args.target.rstrip('/'), args.users, args.admins, args.duration, args.user_offset)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Asynchronous structured logging
+Request threads render the message and put the record on a queue; a
+background listener serialises it (JSON by default) and writes it to stderr. DEBUG records are
+rate-limited per call site so chatty debug lines cannot flood the log.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from config import Config
+
+# Record attributes that are not user-supplied `extra` fields
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, route, extras and traceback"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves only the output formatting to the listener thread
+
+    Like the stock handler, the message and traceback are rendered on the
+    calling thread, so mutable args and live exceptions never cross threads.
+    Unlike it, the record keeps its fields so the listener can build JSON.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the Flask route that emitted them (captured on the calling thread)"""
+
+    def filter(self, record):
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                record.route = request.endpoint or 'unmatched'
+        except Exception:
+            pass
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Let at most `burst` DEBUG records per call site through every `interval` seconds
+
+    The first record after a quiet window reports how many were dropped.
+    """
+
+    def __init__(self, burst, interval):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._sites = {}  # {(pathname, lineno): [window_start, emitted, dropped]}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.burst <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.interval:
+                dropped = state[2] if state else 0
+                self._sites[site] = [now, 1, 0]
+                if dropped:
+                    record.sampled_out = dropped
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+def _build_output_handler():
+    handler = logging.StreamHandler(sys.stderr)
+    if Config.LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    return handler
+
+
+def _start_listener():
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, _build_output_handler())
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork (e.g. gunicorn --preload)
+    if _queue_handler is not None:
+        _start_listener()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level=None):
+    """Route the root logger through the background queue (idempotent)"""
+    global _queue_handler
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, (level or Config.LOG_LEVEL).upper(), logging.INFO))
+    if _queue_handler is not None:
+        return
+
+    _queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(DebugSampler(Config.LOG_DEBUG_SAMPLE_BURST, Config.LOG_DEBUG_SAMPLE_INTERVAL))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    _start_listener()
+
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
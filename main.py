@@ -1,7 +1,9 @@
-from app import app
+from app import app, init_database
 import os
 
 if __name__ == "__main__":
+    # Local development: run the one-time setup before serving
+    init_database(app)
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_ENV", "development") == "development"
     app.run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,240 @@
+"""
+In-process metrics in the Prometheus text exposition format
+Counters, gauges and histograms for TradingView calls, Flask routes and SQL
+statements, served by the admin-only /metrics route. Values are per worker
+process; Prometheus sums them across scrape targets.
+"""
+
+import logging
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) for latency histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # {label values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+class Gauge:
+    """Current value per label set, either set() directly or read from a callback at scrape time"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Use function() -> {label values tuple: value} instead of stored values"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            items = sorted((tuple(str(v) for v in key), value) for key, value in self._function().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+tv_request_seconds = registry.register(Histogram(
+    'tradingview_request_duration_seconds', 'Latency of TradingView HTTP calls', ['endpoint']))
+tv_responses_total = registry.register(Counter(
+    'tradingview_responses_total', 'TradingView responses by status code ("error" for network failures)',
+    ['endpoint', 'status']))
+tv_reauth_total = registry.register(Counter(
+    'tradingview_reauth_total', 'TradingView logins performed by this process', ['result']))
+tv_wait_seconds = registry.register(Counter(
+    'tradingview_wait_seconds_total', 'Time spent deliberately waiting before TradingView calls', ['reason']))
+tv_schedule_wait_seconds = registry.register(Histogram(
+    'tradingview_schedule_wait_seconds', 'Time TradingView calls queued for a rate-limit slot, by lane', ['lane']))
+tv_queue_depth = registry.register(Gauge(
+    'tradingview_queue_depth', 'TradingView calls currently queued for a rate-limit slot, by lane', ['lane']))
+bulk_job_items_total = registry.register(Counter(
+    'bulk_job_items_total', 'Users processed by background bulk jobs', ['kind', 'outcome']))
+http_request_seconds = registry.register(Histogram(
+    'http_request_duration_seconds', 'Latency of Flask routes', ['route', 'method']))
+http_responses_total = registry.register(Counter(
+    'http_responses_total', 'Flask responses by route and status code', ['route', 'method', 'status']))
+sql_statements_total = registry.register(Counter(
+    'sql_statements_total', 'SQL statements executed, by the route that issued them', ['route']))
+sql_seconds_total = registry.register(Counter(
+    'sql_duration_seconds_total', 'Time spent executing SQL statements, by route', ['route']))
+sql_slow_total = registry.register(Counter(
+    'sql_slow_statements_total', 'SQL statements slower than SLOW_QUERY_MS, by route', ['route']))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def current_route():
+    """Flask endpoint name of the current request, or 'background' outside one"""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('statement_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    route = current_route()
+    sql_statements_total.inc(route=route)
+    sql_seconds_total.inc(elapsed, route=route)
+
+    # Per-request totals, reported in debug response headers
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+
+    if elapsed * 1000 >= Config.SLOW_QUERY_MS:
+        sql_slow_total.inc(route=route)
+        logger.warning(f"Slow query ({elapsed * 1000:.1f}ms) in {route}: {' '.join(statement.split())[:500]}")
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_statement(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = context.connection.info.get('statement_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def init_app(app):
+    """Time every request and count responses per route
+
+    In debug mode each response also carries X-SQL-Count and X-SQL-Time-Ms.
+    """
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = current_route()
+            http_request_seconds.observe(time.perf_counter() - started, route=route, method=request.method)
+            http_responses_total.inc(route=route, method=request.method, status=response.status_code)
+        if app.debug:
+            response.headers['X-SQL-Count'] = str(g.get('sql_count', 0))
+            response.headers['X-SQL-Time-Ms'] = f"{g.get('sql_time', 0.0) * 1000:.1f}"
+        return response
@@ -111,4 +111,58 @@ class UserAccess(db.Model):
     pine_script = db.relationship('PineScript', backref='user_accesses')
     
     def __repr__(self):
-        return f'<UserAccess {self.tradingview_username}: {self.pine_script_id}>'
\ No newline at end of file
+        return f'<UserAccess {self.tradingview_username}: {self.pine_script_id}>'
+
+class TradingViewSession(db.Model):
+    __tablename__ = 'tradingview_sessions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    account = db.Column(db.String(100), unique=True, nullable=False)
+    cookies = db.Column(db.Text, nullable=False, default='[]')  # JSON list of cookie dicts
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped on every save (optimistic locking)
+    login_lease_until = db.Column(db.DateTime, nullable=True)  # set while one worker is logging in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TradingViewSession {self.account}: v{self.version}>'
+
+
+class BulkJob(db.Model):
+    __tablename__ = 'bulk_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # 'grant_script', 'revoke_script', 'migrate_script'
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments for the job kind
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'completed', 'failed', 'cancelled'
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    cursor = db.Column(db.Integer, nullable=False, default=0)  # last user id processed (resume point)
+    total = db.Column(db.Integer, nullable=True)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # heartbeat while running
+    
+    def __repr__(self):
+        return f'<BulkJob {self.id} {self.kind}: {self.status}>'
+
+
+class IdempotencyRecord(db.Model):
+    __tablename__ = 'idempotency_records'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)  # client's Idempotency-Key header
+    fingerprint = db.Column(db.String(40), nullable=False)  # hash of action, username and pine_ids
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # 'in_progress', 'completed'
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.user_id}:{self.key} {self.status}>'
@@ -0,0 +1,55 @@
+"""
+Cached catalogue of active Pine Scripts
+/api/pine-scripts is fetched on every manage page view but only changes
+through the admin routes, so the serialized response is kept in process
+and rebuilt only after invalidate() or once PINE_SCRIPTS_CACHE_TTL expires
+(the TTL bounds staleness in other workers, which do not see invalidate())
+"""
+
+import hashlib
+import json
+import threading
+import time
+from config import Config
+
+# (version, expires_at, body, etag) of the current catalogue, or None
+_catalog = None
+_version = 0
+_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return (body, etag) for the active-script catalogue, querying only on a miss"""
+    global _catalog
+    with _lock:
+        cached, version = _catalog, _version
+    if cached and cached[0] == version and cached[1] > time.monotonic():
+        return cached[2], cached[3]
+
+    from models import PineScript
+    scripts = PineScript.query.filter_by(active=True).order_by(PineScript.id).all()
+    body = json.dumps({
+        'success': True,
+        'scripts': [{
+            'id': script.id,
+            'pine_id': script.pine_id,
+            'name': script.name,
+            'description': script.description
+        } for script in scripts]
+    }).encode()
+    # Content hash, so every worker serving the same catalogue sends the same ETag
+    etag = hashlib.sha1(body).hexdigest()
+
+    with _lock:
+        # Skip the store if the catalogue was invalidated while we were querying
+        if _version == version:
+            _catalog = (version, time.monotonic() + Config.PINE_SCRIPTS_CACHE_TTL, body, etag)
+    return body, etag
+
+
+def invalidate():
+    """Drop the cached catalogue; call after any change to pine scripts"""
+    global _catalog, _version
+    with _lock:
+        _version += 1
+        _catalog = None
@@ -0,0 +1,79 @@
+"""
+Per-process cache of logged-in users for Flask-Login's user_loader
+Saves the users SELECT on every authenticated request. Entries are detached
+snapshots merged into each request's session without a query, dropped when
+a commit changes the user and otherwise kept for USER_CACHE_TTL seconds
+(which bounds staleness in other workers)
+"""
+
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
+from config import Config
+from models import User
+
+# {user_id: (expires_at, detached User snapshot)}
+_cache = {}
+_lock = threading.Lock()
+
+
+def load(user_id):
+    """Return the User attached to the current session, or None if it does not exist"""
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        # load=False copies the snapshot into the session without a SELECT
+        return db.session.merge(entry[1], load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None and Config.USER_CACHE_TTL > 0:
+        with _lock:
+            _cache[user_id] = (time.monotonic() + Config.USER_CACHE_TTL, _snapshot(user))
+    return user
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def invalidate_on_commit(user_ids):
+    """Drop these users once the current session commits (for bulk UPDATEs that skip after_flush)
+
+    Invalidating before the commit lets a concurrent request re-cache the old row.
+    """
+    db.session.info.setdefault('changed_user_ids', set()).update(user_ids)
+
+
+def clear():
+    """Drop every entry; call after bulk UPDATE/DELETE statements on users"""
+    with _lock:
+        _cache.clear()
+
+
+def _snapshot(user):
+    state = {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+    snapshot = User(**state)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User) and instance.id is not None:
+            changed.add(instance.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changed_users(session, previous_transaction):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,109 @@
+"""
+On-demand request profiling for admins
+An admin request carrying the X-Profile: 1 header or ?profile=1 runs under
+cProfile. Each profile is kept in PROFILE_DIR as a pstats file (open it with
+snakeviz, flameprof or `python -m pstats`) plus a top-functions summary;
+only the newest PROFILE_KEEP profiles are kept. Requests without the
+trigger only pay for one header and one query-string lookup.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME = re.compile(r'^\d{8}_\d{6}_\d{6}_[\w.-]+\.prof$')
+
+
+def profiling_requested():
+    """True if this request asks to be profiled and comes from an admin"""
+    if request.headers.get('X-Profile') != '1' and request.args.get('profile') != '1':
+        return False
+    return current_user.is_authenticated and current_user.is_admin
+
+
+def save_profile(profiler, route, elapsed):
+    """Write the profile and its summary, then trim the ring buffer; returns the profile name"""
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}_{route or 'unmatched'}.prof"
+    path = os.path.join(Config.PROFILE_DIR, name)
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    summary.write(f"{request.method} {request.full_path.rstrip('?')} took {elapsed * 1000:.1f}ms\n\n")
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+    with open(path[:-len('.prof')] + '.txt', 'w') as f:
+        f.write(summary.getvalue())
+
+    cleanup_profiles()
+    logger.info(f"Saved request profile {name} ({elapsed * 1000:.1f}ms)")
+    return name
+
+
+def list_profiles():
+    """Stored profiles, newest first"""
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(Config.PROFILE_DIR):
+        if PROFILE_NAME.match(filename):
+            stat = os.stat(os.path.join(Config.PROFILE_DIR, filename))
+            profiles.append({
+                'name': filename,
+                'size': stat.st_size,
+                'created': datetime.fromtimestamp(stat.st_mtime)
+            })
+    return sorted(profiles, key=lambda p: p['name'], reverse=True)
+
+
+def profile_path(name, summary=False):
+    """Path of a stored profile (or its summary), or None if it does not exist"""
+    if not PROFILE_NAME.match(name or ''):
+        return None
+    path = os.path.join(Config.PROFILE_DIR, name)
+    if summary:
+        path = path[:-len('.prof')] + '.txt'
+    return path if os.path.exists(path) else None
+
+
+def cleanup_profiles():
+    """Keep only the newest PROFILE_KEEP profiles"""
+    for profile in list_profiles()[Config.PROFILE_KEEP:]:
+        path = os.path.join(Config.PROFILE_DIR, profile['name'])
+        for stale in (path, path[:-len('.prof')] + '.txt'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def init_app(app):
+    """Profile admin requests that ask for it"""
+
+    @app.before_request
+    def _start_profiler():
+        if profiling_requested():
+            g.profiler = cProfile.Profile()
+            g.profile_started = time.perf_counter()
+            g.profiler.enable()
+
+    @app.after_request
+    def _stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            try:
+                name = save_profile(profiler, request.endpoint, time.perf_counter() - g.profile_started)
+                response.headers['X-Profile-Id'] = name
+            except Exception as e:
+                logger.error(f"Error saving request profile: {e}")
+        return response
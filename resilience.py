@@ -0,0 +1,287 @@
+"""
+Resilience helpers for upstream HTTP calls
+Retry with exponential backoff and full jitter, a circuit breaker that
+fails fast while the upstream service is down, and a fair-share scheduler
+that keeps concurrent callers under the upstream's request budget
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited or a transient server-side failure
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget is used up before a call can start"""
+
+
+class Deadline:
+    """Time budget for one request, shared by every upstream call it makes
+
+    Deadline(None) is unbounded. Sub-calls take a share of what is left with
+    split() and bound each attempt with timeout(cap).
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap):
+        """Timeout for a single attempt: the smaller of cap and the time left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(cap, remaining)
+
+    def split(self, parts, minimum=0.0):
+        """Child deadline with an equal share of the time left across `parts` sub-calls
+
+        The share is raised to `minimum` (if that much time is left) so a long
+        list of sub-calls does not give each one an unusably small budget.
+        """
+        remaining = self.remaining()
+        if remaining == float('inf'):
+            return Deadline(None)
+        share = max(remaining / max(parts, 1), min(minimum, remaining))
+        return Deadline(share)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed)
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail immediately. Once reset_timeout seconds have passed a single trial
+    call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Return True if a call may go through now"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """Give back a half-open trial slot that ended without an upstream outcome"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_flight:
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class FairScheduler:
+    """Hands out upstream call slots at `rate` per second (bursts up to `burst`)
+
+    Waiting callers queue in priority lanes (first lane listed wins) and,
+    within a lane, per owner: owners take turns one call at a time, so one
+    owner with many queued calls cannot starve the others. A rate of 0
+    disables scheduling.
+    """
+
+    def __init__(self, rate, burst=1, lanes=('default',)):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = self.interval * (max(burst, 1) - 1)
+        self.next_slot = 0.0
+        self.lanes = tuple(lanes)
+        # {lane: {owner: deque of tickets}}; dicts keep owners in round-robin order
+        self._queues = {lane: {} for lane in self.lanes}
+        self._served = {lane: 0 for lane in self.lanes}
+        self._waited = {lane: 0.0 for lane in self.lanes}
+        self._cond = threading.Condition()
+
+    def acquire(self, lane=None, owner=None, timeout=None):
+        """Wait for a slot; returns the seconds waited, or None if that would exceed timeout"""
+        lane = lane if lane in self._queues else self.lanes[-1]
+        if not self.interval:
+            return 0.0
+        ticket = object()
+        started = time.monotonic()
+        give_up_at = None if timeout is None or timeout == float('inf') else started + timeout
+        with self._cond:
+            self._queues[lane].setdefault(owner, deque()).append(ticket)
+            try:
+                return self._wait_for_turn(lane, owner, ticket, started, give_up_at)
+            except BaseException:
+                # Interrupted (e.g. a greenlet killed mid-wait): do not leave the ticket blocking the queue
+                self._remove(lane, owner, ticket)
+                self._cond.notify_all()
+                raise
+
+    def _wait_for_turn(self, lane, owner, ticket, started, give_up_at):
+        # Called with the condition held and the ticket queued
+        while True:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            ready_at = slot - self.tolerance
+            if self._head() is ticket and ready_at <= now:
+                self.next_slot = slot + self.interval
+                self._pop(lane, owner)
+                waited = now - started
+                self._served[lane] += 1
+                self._waited[lane] += waited
+                self._cond.notify_all()
+                return waited
+            if give_up_at is not None and now >= give_up_at:
+                self._remove(lane, owner, ticket)
+                self._cond.notify_all()
+                return None
+            # The head sleeps until its slot; everyone else until something changes
+            wake_at = ready_at if self._head() is ticket else None
+            if give_up_at is not None:
+                wake_at = give_up_at if wake_at is None else min(wake_at, give_up_at)
+            self._cond.wait(None if wake_at is None else max(0.0, wake_at - now))
+
+    def _head(self):
+        for lane in self.lanes:
+            owners = self._queues[lane]
+            if owners:
+                return owners[next(iter(owners))][0]
+        return None
+
+    def _pop(self, lane, owner):
+        # Served owner goes to the back of its lane's rotation
+        owners = self._queues[lane]
+        tickets = owners.pop(owner)
+        tickets.popleft()
+        if tickets:
+            owners[owner] = tickets
+
+    def _remove(self, lane, owner, ticket):
+        tickets = self._queues[lane][owner]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[lane][owner]
+
+    def stats(self):
+        """{lane: {'queued', 'owners', 'served', 'wait_seconds'}} for this process"""
+        with self._cond:
+            return {lane: {
+                'queued': sum(len(tickets) for tickets in self._queues[lane].values()),
+                'owners': len(self._queues[lane]),
+                'served': self._served[lane],
+                'wait_seconds': round(self._waited[lane], 3)
+            } for lane in self.lanes}
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform(0, min(max_delay, base_delay * 2**attempt))"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retry(func, breaker=None, attempts=3, base_delay=0.5, max_delay=8.0, deadline=None, on_wait=None):
+    """Call func() (which returns a requests.Response) with retries and circuit breaking
+
+    Network errors and RETRYABLE_STATUS_CODES are retried up to `attempts`
+    times in total, but never past `deadline`. The last response is returned
+    even if it is still a retryable failure; the last exception is re-raised
+    if every attempt raised. Raises CircuitOpenError without calling func
+    while the breaker is open, and DeadlineExceeded if no time is left.
+    on_wait(delay) is called before each backoff sleep.
+    """
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("Request deadline exceeded")
+    if breaker and not breaker.allow():
+        raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+
+    response = None
+    error = None
+    try:
+        for attempt in range(attempts):
+            try:
+                response = func()
+                error = None
+            except requests.exceptions.RequestException as e:
+                response = None
+                error = e
+
+            if error is None and response.status_code not in RETRYABLE_STATUS_CODES:
+                if breaker:
+                    breaker.record_success()
+                return response
+
+            if attempt == attempts - 1:
+                break
+
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if response is not None and response.status_code == 429:
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = min(max_delay, max(delay, int(retry_after)))
+            if deadline is not None and deadline.remaining() <= delay:
+                logger.warning("Upstream call failed and the deadline leaves no time to retry")
+                break
+            reason = error if error is not None else f"HTTP {response.status_code}"
+            logger.warning(f"Upstream call failed ({reason}), retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            if on_wait:
+                on_wait(delay)
+            time.sleep(delay)
+    except BaseException:
+        # Not an upstream failure (e.g. DeadlineExceeded, or GreenletExit when a gevent
+        # worker kills the request): free a half-open trial slot
+        if breaker:
+            breaker.release_trial()
+        raise
+
+    if breaker:
+        breaker.record_failure()
+    if response is None:
+        raise error
+    return response
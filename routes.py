@@ -1,17 +1,54 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app, send_file, \
+    get_template_attribute
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 from app import db
-from models import User, AccessKey, AccessLog, PineScript, UserAccess
-from tradingview import TradingViewAPI
+from models import User, AccessKey, AccessLog, PineScript, UserAccess, BulkJob
+from tradingview import get_tv_api, scheduler as tv_scheduler
+import bulk_jobs
+import bulk_keys
+import idempotency
+import pine_catalog
+import principal_cache
+from resilience import Deadline
+from config import Config
+import hmac
 import logging
+import os
 
 main_bp = Blueprint('main', __name__)
 
+
+def release_db_connection():
+    """Return the request's pooled DB connection before a slow TradingView call
+
+    Ends the current read transaction; loaded objects are expired and reload
+    on next access, so copy what you need beforehand.
+    """
+    db.session.rollback()
+
+
 # Home page - Key Entry or Login
 @main_bp.route('/')
 def index():
     return render_template('index.html')
 
+# Liveness probe for the load balancer (does not touch the database)
+@main_bp.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok', 'startup_ms': current_app.config.get('STARTUP_TIME_MS')})
+
+# Prometheus metrics for this worker process (admins, or scrapers holding METRICS_TOKEN)
+@main_bp.route('/metrics')
+def metrics_endpoint():
+    import metrics
+    token = request.headers.get('Authorization', '')
+    token_ok = bool(Config.METRICS_TOKEN) and hmac.compare_digest(token, f"Bearer {Config.METRICS_TOKEN}")
+    if not token_ok and not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    return current_app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 # Key validation and user registration
 @main_bp.route('/validate-key', methods=['POST'])
 def validate_key():
@@ -30,10 +67,10 @@ def validate_key():
         access_key = AccessKey.query.filter_by(key_code=key_code, status='active').first()
     
     if not access_key:
-        # Debug: Show available keys for troubleshooting
-        logging.debug(f"Key lookup failed for: '{clean_key}' and '{key_code}'")
-        all_keys = AccessKey.query.filter_by(status='active').all()
-        logging.debug(f"Available active keys: {[key.key_code for key in all_keys]}")
+        # Debug: only query for troubleshooting details when they will be logged
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            active_count = AccessKey.query.filter_by(status='active').count()
+            logging.debug(f"Key lookup failed for: '{clean_key}' and '{key_code}' ({active_count} active keys)")
         flash('Invalid or expired access key', 'error')
         return redirect(url_for('main.index'))
     
@@ -178,33 +215,160 @@ def admin():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('main.admin_login'))
     
+    # Taken before the queries so the page's first /admin/changes poll overlaps them
+    server_time = datetime.utcnow()
+    
     # Get all access keys with their associated users
-    access_keys = AccessKey.query.order_by(AccessKey.created_at.desc()).all()
-    
-    # Get user access data for each key
-    key_data = []
-    for key in access_keys:
-        key_info = {
-            'key': key,
-            'user': key.user,
-            'accesses': []
-        }
-        
-        if key.user:
-            accesses = UserAccess.query.filter_by(user_id=key.user.id).all()
-            for access in accesses:
-                key_info['accesses'].append({
-                    'pine_script': access.pine_script,
-                    'tradingview_username': access.tradingview_username,
-                    'granted_at': access.granted_at
-                })
-        
-        key_data.append(key_info)
+    access_keys = AccessKey.query.options(joinedload(AccessKey.user)).order_by(AccessKey.created_at.desc()).all()
     
     # Get all Pine Scripts for management
     pine_scripts = PineScript.query.order_by(PineScript.name).all()
     
-    return render_template('admin.html', key_data=key_data, pine_scripts=pine_scripts)
+    return render_template(
+        'admin.html',
+        key_rows=admin_key_rows(access_keys),
+        script_rows=admin_script_rows(pine_scripts),
+        stats=admin_stats(),
+        server_time=server_time.isoformat()
+    )
+
+
+# Admin table rows, shared by the full page and the single-row JSON updates
+def admin_key_rows(keys):
+    """Access-key rows: key, its user and the user's grant count (one grouped query)"""
+    user_ids = [key.user.id for key in keys if key.user]
+    counts = db.session.query(UserAccess.user_id, db.func.count(UserAccess.id)).group_by(UserAccess.user_id)
+    if len(user_ids) <= 500:
+        # For the whole table a full GROUP BY is cheaper than a huge IN list
+        counts = counts.filter(UserAccess.user_id.in_(user_ids))
+    counts = dict(counts.all()) if user_ids else {}
+    return [{
+        'key': key,
+        'user': key.user,
+        'access_count': counts.get(key.user.id, 0) if key.user else 0
+    } for key in keys]
+
+
+def admin_script_rows(scripts):
+    """Pine script rows: script and its holder count (one grouped query)"""
+    script_ids = [script.id for script in scripts]
+    counts = db.session.query(UserAccess.pine_script_id, db.func.count(UserAccess.id)).\
+        group_by(UserAccess.pine_script_id)
+    if len(script_ids) <= 500:
+        counts = counts.filter(UserAccess.pine_script_id.in_(script_ids))
+    counts = dict(counts.all()) if script_ids else {}
+    return [{'script': script, 'user_count': counts.get(script.id, 0)} for script in scripts]
+
+
+def key_row_payload(row):
+    """JSON for one access-key row, including its rendered <tr>"""
+    key, user = row['key'], row['user']
+    render = get_template_attribute('_admin_rows.html', 'key_row')
+    return {
+        'id': key.id,
+        'key_code': key.key_code,
+        'status': key.status,
+        'user_name': key.user_name,
+        'user_email': key.user_email,
+        'user_id': user.id if user else None,
+        'tradingview_username': user.tradingview_username if user else None,
+        'access_count': row['access_count'],
+        'created_at': key.created_at.strftime('%Y-%m-%d %H:%M'),
+        'html': str(render(key, user, row['access_count']))
+    }
+
+
+def script_row_payload(row):
+    """JSON for one pine script row, including its rendered <tr>"""
+    script = row['script']
+    render = get_template_attribute('_admin_rows.html', 'script_row')
+    return {
+        'id': script.id,
+        'name': script.name,
+        'pine_id': script.pine_id,
+        'description': script.description,
+        'active': script.active,
+        'user_count': row['user_count'],
+        'created_at': script.created_at.strftime('%Y-%m-%d %H:%M'),
+        'html': str(render(script, row['user_count']))
+    }
+
+
+def admin_stats():
+    """Dashboard counters in a single statement"""
+    def count(column, *conditions):
+        return db.select(db.func.count(column)).where(*conditions).scalar_subquery()
+    
+    active_keys, used_keys, registered_users, total_grants = db.session.execute(db.select(
+        count(AccessKey.id, AccessKey.status == 'active'),
+        count(AccessKey.id, AccessKey.status == 'used'),
+        count(User.id, User.access_key_id.isnot(None)),
+        count(UserAccess.id, UserAccess.user_id.in_(db.select(User.id).where(User.access_key_id.isnot(None))))
+    )).one()
+    return {
+        'active_keys': active_keys,
+        'used_keys': used_keys,
+        'registered_users': registered_users,
+        'total_grants': total_grants
+    }
+
+
+def touch_access_changes(user_ids=(), script_ids=()):
+    """Bump updated_at on users and scripts whose grants were removed
+
+    Removed UserAccess rows leave no timestamp behind; this lets /admin/changes
+    pick up the new counts. Part of the caller's transaction.
+    """
+    now = datetime.utcnow()
+    if user_ids:
+        User.query.filter(User.id.in_(list(user_ids))).update({User.updated_at: now}, synchronize_session=False)
+        principal_cache.invalidate_on_commit(user_ids)
+    if script_ids:
+        PineScript.query.filter(PineScript.id.in_(list(script_ids))).\
+            update({PineScript.updated_at: now}, synchronize_session=False)
+
+
+# Rows changed since the page (or the previous poll) was rendered
+@main_bp.route('/admin/changes', methods=['GET'])
+@login_required
+def admin_changes():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    try:
+        since = datetime.fromisoformat(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'since must be an ISO timestamp'}), 400
+    
+    server_time = datetime.utcnow()
+    # Timestamps are taken before commit; overlap a little so late commits are not missed
+    since -= timedelta(seconds=5)
+    
+    granted_users = db.select(UserAccess.user_id).where(UserAccess.granted_at > since)
+    granted_scripts = db.select(UserAccess.pine_script_id).where(UserAccess.granted_at > since)
+    keys = AccessKey.query.options(joinedload(AccessKey.user)).\
+        outerjoin(User, User.access_key_id == AccessKey.id).\
+        filter(db.or_(
+            AccessKey.created_at > since,
+            AccessKey.used_at > since,
+            User.updated_at > since,
+            User.id.in_(granted_users)
+        )).order_by(AccessKey.created_at.desc()).all()
+    scripts = PineScript.query.filter(db.or_(
+        PineScript.created_at > since,
+        PineScript.updated_at > since,
+        PineScript.id.in_(granted_scripts)
+    )).order_by(PineScript.name).all()
+    
+    return jsonify({
+        'success': True,
+        'server_time': server_time.isoformat(),
+        'keys': [key_row_payload(row) for row in admin_key_rows(keys)],
+        'scripts': [script_row_payload(row) for row in admin_script_rows(scripts)],
+        # Scripts can be deleted; the page drops rows whose id is no longer listed
+        'script_ids': [script_id for (script_id,) in db.session.query(PineScript.id).all()],
+        'stats': admin_stats()
+    })
 
 # Create new access key (admin only)
 @main_bp.route('/admin/create-key', methods=['POST'])
@@ -221,10 +385,7 @@ def create_key():
         return jsonify({'success': False, 'message': 'Name and email are required'})
     
     # Generate unique key
-    while True:
-        key_code = AccessKey.generate_key()
-        if not AccessKey.query.filter_by(key_code=key_code).first():
-            break
+    key_code = bulk_keys.generate_unique_codes(1)[0]
     
     access_key = AccessKey(
         key_code=key_code,
@@ -238,9 +399,49 @@ def create_key():
     return jsonify({
         'success': True,
         'message': 'Access key created successfully',
-        'key_code': key_code
+        'key_code': key_code,
+        'row': key_row_payload(admin_key_rows([access_key])[0])
     })
 
+# Create many access keys from a CSV of names and emails (admin only)
+@main_bp.route('/admin/bulk-create-keys', methods=['POST'])
+@login_required
+def bulk_create_keys():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    # Refuse oversized bodies before anything (form parsing included) reads them into memory
+    if request.content_length is None:
+        return jsonify({'success': False, 'message': 'Content-Length is required'}), 411
+    if request.content_length > Config.BULK_KEYS_MAX_BYTES:
+        return jsonify({'success': False, 'message': f'Upload larger than {Config.BULK_KEYS_MAX_BYTES} bytes'}), 413
+    
+    # Either an uploaded file or a raw text/csv body
+    upload = request.files.get('file')
+    text = upload.read().decode('utf-8-sig', errors='replace') if upload else request.get_data(as_text=True)
+    entries, errors = bulk_keys.parse_key_requests(text)
+    
+    if errors:
+        return jsonify({'success': False, 'message': f'{len(errors)} invalid row(s), no keys created', 'errors': errors[:50]}), 400
+    if not entries:
+        return jsonify({'success': False, 'message': 'No rows to import'}), 400
+    if len(entries) > Config.BULK_KEYS_MAX_ROWS:
+        return jsonify({'success': False, 'message': f'At most {Config.BULK_KEYS_MAX_ROWS} rows per import'}), 400
+    
+    try:
+        issued = bulk_keys.issue_keys(entries)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error creating keys in bulk: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error creating keys: {str(e)}'}), 500
+    
+    filename = f"access_keys_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    return current_app.response_class(
+        bulk_keys.iter_issued_csv(issued),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Keys-Created': str(len(issued))}
+    )
+
 # Remove user access from admin panel
 @main_bp.route('/admin/remove-access', methods=['POST'])
 @login_required
@@ -260,41 +461,50 @@ def admin_remove_access():
         return jsonify({'success': False, 'message': 'User not found or no TradingView username set'})
     
     try:
-        tv_api = TradingViewAPI()
+        deadline = Deadline(Config.REQUEST_DEADLINE)
+        tv_api = get_tv_api()
         
         # If specific scripts provided, remove only those; otherwise remove all
         if pine_script_ids:
             scripts_to_remove = PineScript.query.filter(PineScript.id.in_(pine_script_ids)).all()
         else:
             # Remove all access for this user
-            user_accesses = UserAccess.query.filter_by(user_id=user_id).all()
-            scripts_to_remove = [access.pine_script for access in user_accesses]
+            scripts_to_remove = PineScript.query.join(UserAccess, UserAccess.pine_script_id == PineScript.id).\
+                filter(UserAccess.user_id == user_id).all()
+        
+        # Plain copies so nothing is reloaded after the connection is released
+        scripts_by_pine_id = {script.pine_id: {'id': script.id, 'name': script.name} for script in scripts_to_remove}
+        username = user.tradingview_username
+        admin_id = current_user.id
+        admin_email = current_user.email
+        release_db_connection()
         
         # Remove access from all scripts at once
-        pine_ids_to_remove = [script.pine_id for script in scripts_to_remove]
-        results = tv_api.remove_access(user.tradingview_username, pine_ids_to_remove)
+        results = tv_api.remove_access(username, list(scripts_by_pine_id), deadline=deadline)
         
         removed_scripts = []
+        removed_script_ids = []
         for result in results:
             if result.get('removed', False):
                 # Find corresponding script
-                script = next((s for s in scripts_to_remove if s.pine_id == result['pine_id']), None)
+                script = scripts_by_pine_id.get(result['pine_id'])
                 if script:
                     # Remove from database
                     UserAccess.query.filter_by(
                         user_id=user_id, 
-                        pine_script_id=script.id
+                        pine_script_id=script['id']
                     ).delete()
-                    removed_scripts.append(script.name)
+                    removed_scripts.append(script['name'])
+                    removed_script_ids.append(script['id'])
                     
                     # Log the action
                     log_entry = AccessLog(
-                        user_id=current_user.id,
-                        username=user.tradingview_username,
+                        user_id=admin_id,
+                        username=username,
                         action='remove',
-                        pine_script_id=script.pine_id,
+                        pine_script_id=result['pine_id'],
                         status='success',
-                        details=f'Removed by admin: {current_user.email}'
+                        details=f'Removed by admin: {admin_email}'
                     )
                     db.session.add(log_entry)
         
@@ -304,12 +514,16 @@ def admin_remove_access():
             user.has_generated_access = False
             user.tradingview_username = None
         
+        if removed_script_ids:
+            touch_access_changes([user_id], removed_script_ids)
         db.session.commit()
         
+        key = AccessKey.query.options(joinedload(AccessKey.user)).filter(AccessKey.user.has(id=user_id)).first()
         return jsonify({
             'success': True,
             'message': f'Successfully removed access for {len(removed_scripts)} script(s)',
-            'removed_scripts': removed_scripts
+            'removed_scripts': removed_scripts,
+            'row': key_row_payload(admin_key_rows([key])[0]) if key else None
         })
     
     except Exception as e:
@@ -348,13 +562,17 @@ def api_validate_username():
                 'message': f'You already have access granted for "{current_user.tradingview_username}". Please remove all access before switching users.'
             })
         
+        # Nothing below needs the database; free the connection during the upstream calls
+        release_db_connection()
+        deadline = Deadline(Config.REQUEST_DEADLINE)
+        
         # Initialize TradingView API
         try:
-            tv_api = TradingViewAPI()
+            tv_api = get_tv_api()
             logging.info("TradingView API initialized successfully")
             
             # Test authentication first
-            if not tv_api._ensure_authenticated():
+            if not tv_api._ensure_authenticated(deadline):
                 logging.error("TradingView authentication failed")
                 return jsonify({
                     'success': False, 
@@ -372,7 +590,7 @@ def api_validate_username():
         
         # Validate username
         logging.info(f"Calling TradingView API to validate username: {username}")
-        result = tv_api.validate_username(username)
+        result = tv_api.validate_username(username, deadline=deadline)
         logging.info(f"TradingView API validation result: {result}")
         
         if result.get('validuser', False):
@@ -403,16 +621,12 @@ def api_validate_username():
 @main_bp.route('/api/pine-scripts')
 @login_required
 def api_pine_scripts():
-    scripts = PineScript.query.filter_by(active=True).all()
-    return jsonify({
-        'success': True,
-        'scripts': [{
-            'id': script.id,
-            'pine_id': script.pine_id,
-            'name': script.name,
-            'description': script.description
-        } for script in scripts]
-    })
+    # Served from the in-process catalogue; browsers revalidate with If-None-Match
+    body, etag = pine_catalog.get_catalog()
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @main_bp.route('/api/grant-access', methods=['POST'])
 @login_required
@@ -434,14 +648,44 @@ def api_grant_access():
             'message': 'You already have access for another username. Remove all access first.'
         })
     
+    # Double submits and retries share one run instead of repeating the TradingView calls
+    return idempotency.run_once(current_user.id, 'grant', username, pine_ids,
+                                lambda: grant_access_for_current_user(username, pine_ids),
+                                key=request.headers.get(idempotency.HEADER))
+
+
+def grant_access_for_current_user(username, pine_ids):
+    """Grant pine_ids to username on TradingView and record the outcome (runs once per duplicate set)"""
     try:
-        tv_api = TradingViewAPI()
-        scripts = PineScript.query.filter(PineScript.pine_id.in_(pine_ids)).all()
+        deadline = Deadline(Config.REQUEST_DEADLINE)
+        tv_api = get_tv_api()
+        user_id = current_user.id
+        # Requested scripts, each with this user's existing grant for this username (if any)
+        scripts = db.session.query(PineScript, UserAccess.id).outerjoin(UserAccess, db.and_(
+            UserAccess.pine_script_id == PineScript.id,
+            UserAccess.user_id == user_id,
+            UserAccess.tradingview_username == username
+        )).filter(PineScript.pine_id.in_(pine_ids)).all()
+        scripts_by_pine_id = {script.pine_id: {'id': script.id, 'name': script.name} for script, _ in scripts}
+        already_granted = {script.pine_id for script, access_id in scripts if access_id is not None}
+        release_db_connection()
+        
+        # Re-granting what UserAccess already records is a no-op upstream; skip it
+        missing = [pine_id for pine_id in dict.fromkeys(pine_ids) if pine_id not in already_granted]
+        if not missing:
+            return jsonify({
+                'success': True,
+                'message': f'{username} already has access to the selected Pine Script(s)',
+                'granted_count': 0,
+                'already_granted': len(already_granted),
+                'failed_scripts': []
+            })
         
-        logging.info(f"Attempting to grant access for {username} to {len(pine_ids)} scripts: {pine_ids}")
+        logging.info(f"Attempting to grant access for {username} to {len(missing)} scripts: {missing} "
+                     f"({len(already_granted)} already granted)")
         
-        # Grant access to all scripts at once
-        results = tv_api.grant_access(username, pine_ids)
+        # Grant access to all missing scripts at once
+        results = tv_api.grant_access(username, missing, deadline=deadline)
         
         logging.info(f"TradingView API results: {results}")
         
@@ -450,49 +694,49 @@ def api_grant_access():
         
         for result in results:
             pine_id = result.get('pine_id')
-            script = next((s for s in scripts if s.pine_id == pine_id), None)
+            script = scripts_by_pine_id.get(pine_id)
             
             if script:
                 if result.get('hasAccess', False) or result.get('status') == 'Success':
                     # Check if access already exists
                     existing_access = UserAccess.query.filter_by(
-                        user_id=current_user.id,
-                        pine_script_id=script.id
+                        user_id=user_id,
+                        pine_script_id=script['id']
                     ).first()
                     
                     if not existing_access:
                         user_access = UserAccess(
-                            user_id=current_user.id,
-                            pine_script_id=script.id,
+                            user_id=user_id,
+                            pine_script_id=script['id'],
                             tradingview_username=username
                         )
                         db.session.add(user_access)
-                        logging.info(f"Added access record for script {script.name}")
+                        logging.info(f"Added access record for script {script['name']}")
                     
                     # Log the action
                     log_entry = AccessLog(
-                        user_id=current_user.id,
+                        user_id=user_id,
                         username=username,
                         action='grant',
-                        pine_script_id=script.pine_id,
+                        pine_script_id=pine_id,
                         status='success',
                         details=f"API Response: {result.get('status', 'Unknown')}"
                     )
                     db.session.add(log_entry)
                     granted_count += 1
                 else:
-                    failed_scripts.append(script.name)
+                    failed_scripts.append(script['name'])
                     # Log failure
                     log_entry = AccessLog(
-                        user_id=current_user.id,
+                        user_id=user_id,
                         username=username,
                         action='grant',
-                        pine_script_id=script.pine_id,
+                        pine_script_id=pine_id,
                         status='failed',
                         details=f"API Response: {result.get('status', 'Failed')}"
                     )
                     db.session.add(log_entry)
-                    logging.warning(f"Failed to grant access to {script.name}: {result}")
+                    logging.warning(f"Failed to grant access to {script['name']}: {result}")
         
         # Update user flags if any access was granted
         if granted_count > 0:
@@ -503,6 +747,8 @@ def api_grant_access():
         
         if granted_count > 0:
             message = f'Successfully granted access to {granted_count} Pine Script(s) for {username}'
+            if already_granted:
+                message += f' ({len(already_granted)} already granted)'
             if failed_scripts:
                 message += f'. Failed: {", ".join(failed_scripts)}'
             
@@ -510,6 +756,7 @@ def api_grant_access():
                 'success': True,
                 'message': message,
                 'granted_count': granted_count,
+                'already_granted': len(already_granted),
                 'failed_scripts': failed_scripts
             })
         else:
@@ -557,6 +804,7 @@ def admin_add_pine_script():
         )
         db.session.add(new_script)
         db.session.commit()
+        pine_catalog.invalidate()
         
         return jsonify({
             'success': True,
@@ -568,7 +816,8 @@ def admin_add_pine_script():
                 'description': new_script.description,
                 'active': new_script.active,
                 'created_at': new_script.created_at.strftime('%Y-%m-%d %H:%M')
-            }
+            },
+            'row': script_row_payload({'script': new_script, 'user_count': 0})
         })
     
     except Exception as e:
@@ -588,35 +837,37 @@ def admin_delete_pine_script(script_id):
         return jsonify({'success': False, 'message': 'Pine Script not found'})
     
     try:
-        # Check if any users have access to this script
-        user_accesses = UserAccess.query.filter_by(pine_script_id=script_id).all()
+        holders = UserAccess.query.filter_by(pine_script_id=script_id).count()
         
-        if user_accesses:
-            # Remove all user accesses first
-            for access in user_accesses:
-                db.session.delete(access)
-            
-            # Log the removal
-            for access in user_accesses:
-                log_entry = AccessLog(
-                    user_id=current_user.id,
-                    username=access.tradingview_username,
-                    action='remove',
-                    pine_script_id=script.pine_id,
-                    status='success',
-                    details=f'Script deleted by admin: {current_user.email}'
-                )
-                db.session.add(log_entry)
-        
-        # Delete the script
-        db.session.delete(script)
+        if not holders:
+            db.session.delete(script)
+            db.session.commit()
+            pine_catalog.invalidate()
+            return jsonify({
+                'success': True,
+                'message': f'Pine Script "{script.name}" deleted successfully',
+                'removed_accesses': 0,
+                'deleted_id': script_id
+            })
+        
+        # Holders keep real access until TradingView revokes it, so revoke them all in a
+        # background job first; it deletes the script once nobody holds it any more
+        script.active = False
         db.session.commit()
+        pine_catalog.invalidate()
         
+        job, created = bulk_jobs.create_job('revoke_script', {'script_id': script_id}, created_by=current_user.email)
+        bulk_jobs.start_job(job.id)
+        message = f'Revoking "{script.name}" from {holders} user(s) on TradingView; it is deleted once every holder is revoked'
+        if not created:
+            message = f'"{script.name}" is already being revoked from its holders'
         return jsonify({
             'success': True,
-            'message': f'Pine Script "{script.name}" deleted successfully',
-            'removed_accesses': len(user_accesses)
-        })
+            'message': message,
+            'removed_accesses': 0,
+            'row': script_row_payload(admin_script_rows([script])[0]),
+            'job': bulk_jobs.job_payload(db.session.get(BulkJob, job.id))
+        }), 202
     
     except Exception as e:
         db.session.rollback()
@@ -637,12 +888,14 @@ def admin_toggle_pine_script(script_id):
     try:
         script.active = not script.active
         db.session.commit()
+        pine_catalog.invalidate()
         
         status = 'activated' if script.active else 'deactivated'
         return jsonify({
             'success': True,
             'message': f'Pine Script "{script.name}" {status} successfully',
-            'active': script.active
+            'active': script.active,
+            'row': script_row_payload(admin_script_rows([script])[0])
         })
     
     except Exception as e:
@@ -672,6 +925,163 @@ def admin_get_pine_scripts():
     })
 
 
+# Grant a Pine Script to every subscriber with a TradingView username (background job)
+@main_bp.route('/admin/grant-pine-script/<int:script_id>', methods=['POST'])
+@login_required
+def admin_grant_pine_script_to_all(script_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    script = db.session.get(PineScript, script_id)
+    if not script:
+        return jsonify({'success': False, 'message': 'Pine Script not found'}), 404
+    if not script.active:
+        return jsonify({'success': False, 'message': 'Activate the Pine Script before granting it to everyone'}), 400
+    
+    job, created = bulk_jobs.create_job('grant_script', {'script_id': script_id}, created_by=current_user.email)
+    started = bulk_jobs.start_job(job.id)
+    if created:
+        message = f'Granting "{script.name}" to all subscribers in the background'
+    elif started:
+        message = f'Resumed the interrupted grant job for "{script.name}"'
+    else:
+        message = f'A grant job for "{script.name}" is already running'
+    return jsonify({
+        'success': True,
+        'message': message,
+        'job': bulk_jobs.job_payload(db.session.get(BulkJob, job.id))
+    }), 202
+
+
+# Move every holder of a republished script to its new pine_id (background job)
+@main_bp.route('/admin/migrate-pine-script/<int:script_id>', methods=['POST'])
+@login_required
+def admin_migrate_pine_script(script_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    data = request.get_json() or {}
+    source = db.session.get(PineScript, script_id)
+    if data.get('to_script_id'):
+        target = db.session.get(PineScript, int(data['to_script_id']))
+    else:
+        target = PineScript.query.filter_by(pine_id=(data.get('to_pine_id') or '').strip()).first()
+    if not source or not target:
+        return jsonify({'success': False, 'message': 'Pine Script not found; add the new Pine ID as a script first'}), 404
+    if source.id == target.id:
+        return jsonify({'success': False, 'message': 'Choose a different Pine Script to migrate to'}), 400
+    
+    job, created = bulk_jobs.create_job('migrate_script', {'from_script_id': source.id, 'to_script_id': target.id},
+                                        created_by=current_user.email)
+    started = bulk_jobs.start_job(job.id)
+    if created:
+        message = f'Moving holders of "{source.name}" to "{target.name}" in the background'
+    elif started:
+        message = f'Resumed the interrupted migration of "{source.name}"'
+    else:
+        message = f'Holders of "{source.name}" are already being migrated'
+    return jsonify({
+        'success': True,
+        'message': message,
+        'job': bulk_jobs.job_payload(db.session.get(BulkJob, job.id))
+    }), 202
+
+
+# Background bulk jobs: progress, cancel and resume
+@main_bp.route('/admin/jobs', methods=['GET'])
+@login_required
+def admin_list_jobs():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    jobs = BulkJob.query.order_by(BulkJob.id.desc()).limit(20).all()
+    return jsonify({
+        'success': True,
+        'jobs': [bulk_jobs.job_payload(job) for job in jobs],
+        # TradingView call queue of this worker, per priority lane
+        'scheduler': tv_scheduler.stats()
+    })
+
+
+@main_bp.route('/admin/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def admin_get_job(job_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    job = db.session.get(BulkJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': bulk_jobs.job_payload(job)})
+
+
+@main_bp.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def admin_cancel_job(job_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    job = db.session.get(BulkJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.status not in bulk_jobs.ACTIVE_STATUSES:
+        return jsonify({'success': False, 'message': f'Job is already {job.status}'}), 409
+    
+    bulk_jobs.request_cancel(job)
+    return jsonify({'success': True, 'message': 'Job will stop after its current batch', 'job': bulk_jobs.job_payload(job)})
+
+
+@main_bp.route('/admin/jobs/<int:job_id>/resume', methods=['POST'])
+@login_required
+def admin_resume_job(job_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    job = db.session.get(BulkJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if not bulk_jobs.start_job(job_id):
+        return jsonify({'success': False, 'message': f'Job is {job.status} and cannot be resumed now'}), 409
+    
+    db.session.refresh(job)
+    return jsonify({'success': True, 'message': 'Job resumed', 'job': bulk_jobs.job_payload(job)})
+
+
+# Admin request profiles (captured with X-Profile: 1 or ?profile=1)
+@main_bp.route('/admin/profiles', methods=['GET'])
+@login_required
+def admin_list_profiles():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    import profiling
+    return jsonify({
+        'success': True,
+        'profiles': [{
+            'name': profile['name'],
+            'size': profile['size'],
+            'created': profile['created'].strftime('%Y-%m-%d %H:%M:%S')
+        } for profile in profiling.list_profiles()]
+    })
+
+
+@main_bp.route('/admin/profiles/<name>', methods=['GET'])
+@login_required
+def admin_get_profile(name):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    import profiling
+    # Top functions as text by default; ?download=1 returns the raw pstats file
+    download = request.args.get('download') == '1'
+    path = profiling.profile_path(name, summary=not download)
+    if not path:
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    if download:
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+    return send_file(os.path.abspath(path), mimetype='text/plain')
+
+
 # Admin Data Management Routes
 @main_bp.route('/admin/backup', methods=['POST'])
 @login_required
@@ -685,8 +1095,11 @@ def admin_create_backup():
         
         data = request.get_json() or {}
         backup_name = data.get('name')
+        backup_format = data.get('format')
+        if backup_format not in (None, 'native', 'json'):
+            return jsonify({'success': False, 'message': 'Backup format must be "native" or "json"'})
         
-        backup_file = backup_manager.create_backup(backup_name)
+        backup_file = backup_manager.create_backup(backup_name, backup_format)
         if backup_file:
             return jsonify({
                 'success': True,
@@ -723,6 +1136,8 @@ def admin_list_backups():
         for backup in backups:
             backup_data.append({
                 'name': backup['name'],
+                'format': backup['format'],
+                'kind': backup['kind'],
                 'size': backup['size'],
                 'size_mb': round(backup['size'] / (1024 * 1024), 2),
                 'modified': backup['modified'].strftime('%Y-%m-%d %H:%M:%S')
@@ -751,7 +1166,12 @@ def admin_health_check():
         from data_recovery import DataRecovery
         recovery = DataRecovery()
         
-        health = recovery.check_database_health()
+        use_cache = request.args.get('refresh') != '1'
+        approximate = request.args.get('approximate')
+        health = recovery.check_database_health(
+            use_cache=use_cache,
+            approximate=None if approximate is None else approximate == '1'
+        )
         return jsonify({
             'success': True,
             'health': health
@@ -775,7 +1195,12 @@ def admin_validate_data():
         from data_recovery import DataRecovery
         recovery = DataRecovery()
         
-        result = recovery.validate_data_integrity()
+        data = request.get_json(silent=True) or {}
+        result = recovery.validate_data_integrity(dry_run=bool(data.get('dry_run', False)))
+        if result.get('fixes_applied'):
+            # Fixes are bulk statements (duplicate scripts included) that bypass the caches' change tracking
+            principal_cache.clear()
+            pine_catalog.invalidate()
         return jsonify({
             'success': True,
             'validation_result': result
@@ -800,6 +1225,7 @@ def admin_recover_defaults():
         recovery = DataRecovery()
         
         result = recovery.recover_default_data()
+        pine_catalog.invalidate()
         return jsonify({
             'success': True,
             'recovery_result': result
@@ -824,30 +1250,45 @@ def api_remove_access():
     if not username:
         return jsonify({'success': False, 'message': 'No username to remove access for'})
     
+    return idempotency.run_once(current_user.id, 'remove', username, (),
+                                lambda: remove_access_for_current_user(username),
+                                key=request.headers.get(idempotency.HEADER))
+
+
+def remove_access_for_current_user(username):
+    """Remove every script the current user holds from username on TradingView"""
     try:
-        tv_api = TradingViewAPI()
+        deadline = Deadline(Config.REQUEST_DEADLINE)
+        tv_api = get_tv_api()
         
-        # Get all user accesses
-        user_accesses = UserAccess.query.filter_by(user_id=current_user.id).all()
-        pine_ids_to_remove = [access.pine_script.pine_id for access in user_accesses]
+        # Get all user accesses (access id per pine_id) in one query
+        user_id = current_user.id
+        accesses_by_pine_id = dict(
+            db.session.query(PineScript.pine_id, UserAccess.id).
+            join(UserAccess, UserAccess.pine_script_id == PineScript.id).
+            filter(UserAccess.user_id == user_id).all()
+        )
+        release_db_connection()
         
         # Remove access from all scripts at once
-        results = tv_api.remove_access(username, pine_ids_to_remove)
+        results = tv_api.remove_access(username, list(accesses_by_pine_id), deadline=deadline)
         
         removed_count = 0
+        removed_pine_ids = []
         for result in results:
             if result.get('removed', False):
                 # Find and remove the corresponding access
-                access = next((a for a in user_accesses if a.pine_script.pine_id == result['pine_id']), None)
-                if access:
-                    db.session.delete(access)
+                access_id = accesses_by_pine_id.get(result['pine_id'])
+                if access_id:
+                    UserAccess.query.filter_by(id=access_id).delete()
+                    removed_pine_ids.append(result['pine_id'])
                     
                     # Log the action
                     log_entry = AccessLog(
-                        user_id=current_user.id,
+                        user_id=user_id,
                         username=username,
                         action='remove',
-                        pine_script_id=access.pine_script.pine_id,
+                        pine_script_id=result['pine_id'],
                         status='success'
                     )
                     db.session.add(log_entry)
@@ -857,6 +1298,11 @@ def api_remove_access():
         current_user.has_generated_access = False
         current_user.tradingview_username = None
         
+        if removed_pine_ids:
+            touch_access_changes(script_ids=[
+                script_id for (script_id,) in
+                db.session.query(PineScript.id).filter(PineScript.pine_id.in_(removed_pine_ids)).all()
+            ])
         db.session.commit()
         
         return jsonify({
@@ -0,0 +1,131 @@
+"""
+Shared TradingView session store
+Keeps the TradingView login cookies in the database so every worker and
+instance reuses one login instead of each signing in on its own
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from app import db
+from config import Config
+from models import TradingViewSession
+
+logger = logging.getLogger(__name__)
+
+# In-process cache of the last record read per account: {account: (fetched_at, record)}
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class SessionStore:
+    """Database-backed cookie store with optimistic versioning and a short in-process cache
+
+    Records are plain dicts: {'cookies': [...], 'version': int, 'updated_at': datetime}.
+    All statements run on their own connection so they never commit or roll
+    back the caller's ORM session.
+    """
+
+    def __init__(self, account):
+        self.account = account or 'default'
+        self.table = TradingViewSession.__table__
+
+    def load(self, max_age=None):
+        """Return the stored record, or None if nothing has been saved yet"""
+        max_age = Config.TV_SESSION_CACHE_TTL if max_age is None else max_age
+        with _cache_lock:
+            cached = _cache.get(self.account)
+        if cached and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(self.table.c.cookies, self.table.c.version, self.table.c.updated_at)
+                .where(self.table.c.account == self.account)
+            ).first()
+
+        record = None
+        if row:
+            record = {
+                'cookies': json.loads(row.cookies),
+                'version': row.version,
+                'updated_at': row.updated_at
+            }
+        self._cache(record)
+        return record
+
+    def save(self, cookies, expected_version):
+        """Save cookies if the stored version still matches expected_version
+
+        Returns the new version, or None when another worker saved first.
+        """
+        now = datetime.utcnow()
+        payload = json.dumps(cookies)
+
+        with db.engine.begin() as conn:
+            if expected_version is None:
+                exists = conn.execute(
+                    db.select(self.table.c.id).where(self.table.c.account == self.account)
+                ).first()
+                if exists:
+                    return None
+                try:
+                    conn.execute(self.table.insert().values(
+                        account=self.account, cookies=payload, version=1, updated_at=now
+                    ))
+                except IntegrityError:
+                    return None
+                new_version = 1
+            else:
+                result = conn.execute(
+                    self.table.update()
+                    .where(self.table.c.account == self.account, self.table.c.version == expected_version)
+                    .values(cookies=payload, version=expected_version + 1,
+                            login_lease_until=None, updated_at=now)
+                )
+                if result.rowcount == 0:
+                    return None
+                new_version = expected_version + 1
+
+        self._cache({'cookies': cookies, 'version': new_version, 'updated_at': now})
+        return new_version
+
+    def acquire_login_lease(self, seconds=None):
+        """Claim the right to log in for a short lease; False if another worker holds it"""
+        seconds = Config.TV_LOGIN_LEASE_SECONDS if seconds is None else seconds
+        now = datetime.utcnow()
+
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                self.table.update()
+                .where(
+                    self.table.c.account == self.account,
+                    db.or_(self.table.c.login_lease_until.is_(None), self.table.c.login_lease_until < now)
+                )
+                .values(login_lease_until=now + timedelta(seconds=seconds))
+            )
+            if result.rowcount:
+                return True
+            # No row yet means nobody has logged in; the first save resolves any race
+            exists = conn.execute(
+                db.select(self.table.c.id).where(self.table.c.account == self.account)
+            ).first()
+            return exists is None
+
+    def wait_for_newer(self, version, timeout=None, interval=0.5):
+        """Poll until a record newer than version appears; returns it or None on timeout"""
+        timeout = Config.TV_LOGIN_LEASE_SECONDS if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            record = self.load(max_age=0)
+            if record and (version is None or record['version'] > version):
+                return record
+            time.sleep(interval)
+        return None
+
+    def _cache(self, record):
+        with _cache_lock:
+            _cache[self.account] = (time.monotonic(), record)
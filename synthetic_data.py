@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator
+Fills every table with realistic-looking data in bulk so performance can be
+measured at production-like sizes (tens of thousands of keys, hundreds of
+thousands of accesses, millions of log rows)
+"""
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, AccessKey, AccessLog, PineScript, UserAccess
+
+logger = logging.getLogger(__name__)
+
+# Every synthetic row is recognisable by these markers (see purge_synthetic_data)
+KEY_PREFIX = 'SYN'
+EMAIL_DOMAIN = 'synthetic.example.com'
+PINE_ID_PREFIX = 'PUB;synthetic'
+
+# All synthetic users share this password so load tests can log in as them
+# (user number n is user<n>@EMAIL_DOMAIN with TradingView username syn_trader_<n>)
+SYNTHETIC_PASSWORD = 'loadtest123'
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Priya', 'Wei', 'Mateo', 'Aisha', 'Lukas', 'Yuki', 'Omar', 'Elena', 'Kofi', 'Ines']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Patel', 'Müller', 'Rossi', 'Kim', 'Silva', 'Novak', 'Okafor',
+              'Johnson', 'Tanaka', 'Haddad', 'Kowalski', 'Nguyen', 'Larsen', 'Moreau', 'Costa', 'Ivanov', 'Ali']
+
+
+def _synthetic_keys():
+    # Real keys are random and could start with KEY_PREFIX; the email domain rules them out
+    return AccessKey.key_code.like(f'{KEY_PREFIX}%'), AccessKey.user_email.like(f'%@{EMAIL_DOMAIN}')
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(model, rows, batch_size):
+    """executemany INSERT in batches, committing each; returns the row count"""
+    count = 0
+    for batch in _batches(rows, batch_size):
+        db.session.execute(db.insert(model.__table__), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def generate_synthetic_data(keys=50000, users=None, accesses=200000, logs=1000000,
+                            scripts=20, batch_size=5000, seed=None, progress=None):
+    """Insert synthetic keys, users, pine scripts, accesses and logs
+
+    users defaults to half of keys (each user consumes one key; the rest stay
+    active or expired). accesses is capped at users * scripts so no user gets
+    the same script twice. Safe to run repeatedly: new rows continue the
+    numbering of earlier runs. Returns the number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    users = keys // 2 if users is None else min(users, keys)
+    report = progress or (lambda message: logger.info(message))
+    started = time.perf_counter()
+    now = datetime.utcnow()
+
+    def past(days):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    def person(i):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return f"{first} {last}", f"user{i}@{EMAIL_DOMAIN}"
+
+    with app.app_context():
+        db.create_all()
+        offset = db.session.query(AccessKey).filter(*_synthetic_keys()).count()
+        counts = {}
+
+        # Pine scripts
+        script_offset = db.session.query(PineScript).filter(PineScript.pine_id.like(f'{PINE_ID_PREFIX}%')).count()
+        counts['pine_scripts'] = _bulk_insert(PineScript, ({
+            'pine_id': f'{PINE_ID_PREFIX}{script_offset + i:06d}',
+            'name': f'Synthetic Script {script_offset + i}',
+            'description': 'Generated for load testing',
+            'active': rng.random() > 0.1,
+            'created_at': past(365),
+            'updated_at': now
+        } for i in range(scripts)), batch_size)
+        script_rows = db.session.query(PineScript.id, PineScript.pine_id).\
+            filter(PineScript.pine_id.like(f'{PINE_ID_PREFIX}%')).all()
+        report(f"Inserted {counts['pine_scripts']} pine scripts")
+
+        # Access keys: the first `users` of this run are used by the users below
+        people = [person(offset + i) for i in range(keys)]
+        counts['access_keys'] = _bulk_insert(AccessKey, ({
+            'key_code': f'{KEY_PREFIX}{offset + i:013d}',
+            'user_name': people[i][0],
+            'user_email': people[i][1],
+            'status': 'used' if i < users else rng.choice(['active'] * 9 + ['expired']),
+            'created_by_admin': True,
+            'created_at': past(365),
+            'used_at': now - timedelta(days=rng.randint(0, 180)) if i < users else None
+        } for i in range(keys)), batch_size)
+        report(f"Inserted {counts['access_keys']} access keys")
+
+        key_ids = dict(db.session.query(AccessKey.key_code, AccessKey.id).filter(
+            AccessKey.key_code >= f'{KEY_PREFIX}{offset:013d}', *_synthetic_keys()
+        ).all())
+
+        # Users (one password hash for all: hashing is deliberately slow)
+        password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+        counts['users'] = _bulk_insert(User, ({
+            'email': people[i][1],
+            'password_hash': password_hash,
+            'name': people[i][0],
+            'is_admin': False,
+            'access_key_id': key_ids[f'{KEY_PREFIX}{offset + i:013d}'],
+            'tradingview_username': f'syn_trader_{offset + i}',
+            'has_generated_access': False,
+            'created_at': past(180),
+            'updated_at': now
+        } for i in range(users)), batch_size)
+        user_rows = db.session.query(User.id, User.tradingview_username).\
+            filter(User.access_key_id.in_(db.session.query(AccessKey.id).filter(
+                AccessKey.key_code >= f'{KEY_PREFIX}{offset:013d}', *_synthetic_keys()
+            ))).order_by(User.id).all()
+        report(f"Inserted {counts['users']} users")
+
+        # Accesses: user j % n gets script (j // n + shift) % s, so pairs never repeat
+        accesses = min(accesses, len(user_rows) * len(script_rows)) if script_rows else 0
+        shifts = [rng.randrange(len(script_rows) or 1) for _ in user_rows]
+
+        def access_rows():
+            for j in range(accesses):
+                u = j % len(user_rows)
+                script_id, _ = script_rows[(j // len(user_rows) + shifts[u]) % len(script_rows)]
+                yield {
+                    'user_id': user_rows[u][0],
+                    'pine_script_id': script_id,
+                    'tradingview_username': user_rows[u][1],
+                    'granted_at': past(180)
+                }
+
+        counts['user_accesses'] = _bulk_insert(UserAccess, access_rows(), batch_size)
+        if accesses:
+            holders = [row[0] for row in user_rows[:accesses]]
+            for batch in _batches(holders, batch_size):
+                db.session.query(User).filter(User.id.in_(batch)).\
+                    update({User.has_generated_access: True}, synchronize_session=False)
+            db.session.commit()
+        report(f"Inserted {counts['user_accesses']} user accesses")
+
+        # Audit log
+        def log_rows():
+            for _ in range(logs if user_rows else 0):
+                user_id, username = rng.choice(user_rows)
+                failed = rng.random() < 0.08
+                yield {
+                    'user_id': user_id,
+                    'username': username,
+                    'action': rng.choice(['grant', 'grant', 'grant', 'remove']),
+                    'pine_script_id': rng.choice(script_rows)[1] if script_rows else None,
+                    'status': 'failed' if failed else 'success',
+                    'details': 'HTTP 500' if failed else None,
+                    'timestamp': past(365)
+                }
+
+        counts['access_logs'] = 0
+        for batch in _batches(log_rows(), batch_size):
+            counts['access_logs'] += _bulk_insert(AccessLog, batch, batch_size)
+            if counts['access_logs'] % (batch_size * 20) == 0:
+                report(f"  ... {counts['access_logs']} access logs")
+        report(f"Inserted {counts['access_logs']} access logs")
+
+    report(f"Synthetic data generated in {time.perf_counter() - started:.1f}s")
+    return counts
+
+
+def purge_synthetic_data():
+    """Delete every synthetic row (and nothing else); returns rows deleted per table"""
+    with app.app_context():
+        synthetic_users = db.session.query(User.id).filter(User.email.like(f'%@{EMAIL_DOMAIN}'))
+        synthetic_scripts = db.session.query(PineScript.id).filter(PineScript.pine_id.like(f'{PINE_ID_PREFIX}%'))
+        counts = {
+            'access_logs': AccessLog.query.filter(AccessLog.user_id.in_(synthetic_users)).delete(synchronize_session=False),
+            'user_accesses': UserAccess.query.filter(db.or_(
+                UserAccess.user_id.in_(synthetic_users),
+                UserAccess.pine_script_id.in_(synthetic_scripts)
+            )).delete(synchronize_session=False),
+            'users': User.query.filter(User.email.like(f'%@{EMAIL_DOMAIN}')).delete(synchronize_session=False),
+            'access_keys': AccessKey.query.filter(*_synthetic_keys()).delete(synchronize_session=False),
+            'pine_scripts': PineScript.query.filter(PineScript.pine_id.like(f'{PINE_ID_PREFIX}%')).delete(synchronize_session=False),
+        }
+        db.session.commit()
+        return counts
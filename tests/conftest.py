@@ -0,0 +1,86 @@
+"""
+Shared fixtures: an in-memory SQLite app from create_app() and a stand-in
+for the TradingView client that records its calls instead of making them
+"""
+
+import os
+
+# Must be set before config (and so the app module) is imported
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['TV_BACKGROUND_REFRESH'] = 'false'
+os.environ['STARTUP_MODE'] = 'lazy'
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+
+import pytest
+from app import create_app, db
+from models import PineScript, User
+import principal_cache
+import tradingview
+
+
+class FakeTradingView:
+    """Grants and removes everything unless `statuses` says otherwise for a username
+
+    statuses[username] is the status text to report, or None to act as if the
+    login to TradingView was lost (the real client then returns no results).
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.statuses = {}
+
+    def grant_access(self, username, pine_ids, duration="1L", deadline=None):
+        return self._results('grant', username, pine_ids)
+
+    def remove_access(self, username, pine_ids, deadline=None):
+        return self._results('remove', username, pine_ids)
+
+    def _results(self, action, username, pine_ids):
+        self.calls.append((action, username, tuple(pine_ids)))
+        status = self.statuses.get(username, 'Success')
+        if status is None:
+            return []
+        return [{'pine_id': pine_id, 'username': username, 'hasAccess': status == 'Success', 'status': status}
+                for pine_id in pine_ids]
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    principal_cache.clear()
+
+
+@pytest.fixture
+def tv(monkeypatch):
+    fake = FakeTradingView()
+    monkeypatch.setattr(tradingview, '_tv_api', fake)
+    tradingview.circuit_breaker.record_success()
+    yield fake
+    tradingview.circuit_breaker.record_success()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(name, tradingview_username=None, password='secret123'):
+        user = User(email=f'{name}@example.com', name=name, tradingview_username=tradingview_username)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_script(app):
+    def make(pine_id, name=None, active=True):
+        script = PineScript(pine_id=pine_id, name=name or pine_id, active=active)
+        db.session.add(script)
+        db.session.commit()
+        return script
+    return make
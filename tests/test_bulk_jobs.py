@@ -0,0 +1,168 @@
+import pytest
+from flask import current_app
+from app import db
+from config import Config
+from models import AccessLog, BulkJob, UserAccess
+import bulk_jobs
+import tradingview
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(Config, 'BULK_JOB_BATCH_SIZE', 3)
+    monkeypatch.setattr(Config, 'BULK_JOB_CONCURRENCY', 2)
+
+
+@pytest.fixture
+def subscribers(make_user):
+    return [make_user(f'trader{n}', tradingview_username=f'tv_trader{n}') for n in range(1, 8)]
+
+
+def run(kind, params):
+    job, _ = bulk_jobs.create_job(kind, params)
+    assert bulk_jobs.claim_job(job.id)
+    return bulk_jobs.run_job(job.id)
+
+
+def resume(job):
+    assert bulk_jobs.claim_job(job.id)
+    return bulk_jobs.run_job(job.id)
+
+
+def test_grant_job_checkpoints_every_batch(tv, subscribers, make_script):
+    script = make_script('PUB;new')
+
+    job = run('grant_script', {'script_id': script.id})
+
+    assert job.status == 'completed'
+    assert (job.total, job.processed, job.succeeded, job.failed) == (7, 7, 7, 0)
+    assert job.cursor == subscribers[-1].id
+    assert UserAccess.query.filter_by(pine_script_id=script.id).count() == 7
+    assert sorted(username for action, username, pine_ids in tv.calls) == \
+        sorted(user.tradingview_username for user in subscribers)
+
+
+def test_rejected_users_are_recorded_as_failed_and_passed(tv, subscribers, make_script):
+    script = make_script('PUB;new')
+    # A whole batch (the first three users) that TradingView rejects must not block the job
+    for user in subscribers[:3]:
+        tv.statuses[user.tradingview_username] = 'Failed: username not found'
+
+    job = run('grant_script', {'script_id': script.id})
+
+    assert job.status == 'completed'
+    assert (job.processed, job.succeeded, job.failed) == (7, 4, 3)
+    assert job.cursor == subscribers[-1].id
+    assert AccessLog.query.filter_by(status='failed').count() == 3
+
+
+def test_outage_stops_at_the_first_affected_user_and_resumes_there(tv, subscribers, make_script):
+    script = make_script('PUB;new')
+    lost_login_from = subscribers[4]
+    for user in subscribers[4:]:
+        tv.statuses[user.tradingview_username] = None
+
+    job = run('grant_script', {'script_id': script.id})
+
+    assert job.status == 'failed'
+    assert 'not authenticated' in job.last_error
+    # The batch with the outage still checkpointed the user before it
+    assert job.cursor == subscribers[3].id
+    assert (job.processed, job.succeeded, job.failed) == (4, 4, 0)
+    assert AccessLog.query.count() == 4
+
+    tv.statuses.clear()
+    tv.calls.clear()
+    job = resume(job)
+
+    assert job.status == 'completed'
+    assert (job.processed, job.succeeded, job.failed) == (7, 7, 0)
+    assert [username for action, username, pine_ids in tv.calls] == \
+        [user.tradingview_username for user in subscribers[4:]]
+    assert lost_login_from.tradingview_username in {access.tradingview_username for access in UserAccess.query}
+
+
+def test_open_circuit_stops_the_job_before_advancing_past_failures(tv, subscribers, make_script, monkeypatch):
+    script = make_script('PUB;new')
+    for user in subscribers:
+        tv.statuses[user.tradingview_username] = 'Failed: HTTP 503'
+    monkeypatch.setattr(tradingview.circuit_breaker, 'opened_at', float('inf'))
+
+    job = run('grant_script', {'script_id': script.id})
+
+    assert job.status == 'failed'
+    assert 'circuit open' in job.last_error
+    assert (job.cursor, job.processed) == (0, 0)
+
+
+def test_cancel_stops_between_batches(tv, subscribers, make_script):
+    script = make_script('PUB;new')
+    job, _ = bulk_jobs.create_job('grant_script', {'script_id': script.id})
+    assert bulk_jobs.claim_job(job.id)
+    bulk_jobs.request_cancel(job)
+
+    job = bulk_jobs.run_job(job.id)
+
+    assert job.status == 'cancelled'
+    assert job.cursor == 0 and tv.calls == []
+    assert bulk_jobs.job_payload(job)['resumable']
+
+
+def test_create_job_reuses_an_unfinished_job(app, make_script):
+    script = make_script('PUB;new')
+    first, created = bulk_jobs.create_job('grant_script', {'script_id': script.id})
+    second, created_again = bulk_jobs.create_job('grant_script', {'script_id': script.id})
+    assert created and not created_again
+    assert first.id == second.id
+    assert BulkJob.query.count() == 1
+
+
+def test_migration_keeps_grants_when_revokes_fail_and_resume_retries_only_revokes(tv, subscribers, make_script):
+    old, new = make_script('PUB;old', active=False), make_script('PUB;new')
+    for user in subscribers[:4]:
+        db.session.add(UserAccess(user_id=user.id, pine_script_id=old.id, tradingview_username=user.tradingview_username))
+    db.session.commit()
+    tv.remove_access = lambda username, pine_ids, deadline=None: \
+        [{'pine_id': pine_ids[0], 'status': 'Failed: HTTP 500'}]
+
+    job = run('migrate_script', {'from_script_id': old.id, 'to_script_id': new.id})
+
+    assert job.status == 'failed'
+    assert '4 holder(s) still hold the old script' in job.last_error
+    # Rewound for the retry: progress counts only the holders left
+    assert (job.cursor, job.total, job.processed, job.succeeded, job.failed) == (0, 4, 0, 0, 0)
+    assert UserAccess.query.filter_by(pine_script_id=new.id).count() == 4
+    assert AccessLog.query.filter_by(action='grant', status='success').count() == 4
+
+    del tv.remove_access
+    tv.calls.clear()
+    job = resume(job)
+
+    assert job.status == 'completed'
+    assert (job.total, job.processed, job.succeeded, job.failed) == (4, 4, 4, 0)
+    assert bulk_jobs.job_payload(job)['progress'] == 100
+    assert {action for action, username, pine_ids in tv.calls} == {'remove'}
+    assert UserAccess.query.filter_by(pine_script_id=old.id).count() == 0
+    assert UserAccess.query.filter_by(pine_script_id=new.id).count() == 4
+
+
+def test_grant_made_during_the_batch_is_not_duplicated(tv, subscribers, make_script):
+    script = make_script('PUB;new')
+    self_granted = subscribers[1]
+    grant_access = tv.grant_access
+
+    def grant_while_the_batch_runs(username, pine_ids, **kwargs):
+        if username == self_granted.tradingview_username:
+            # The user grants the script themselves after the batch was fetched
+            with current_app.app_context():
+                db.session.add(UserAccess(user_id=self_granted.id, pine_script_id=script.id,
+                                          tradingview_username=username))
+                db.session.commit()
+        return grant_access(username, pine_ids, **kwargs)
+
+    tv.grant_access = grant_while_the_batch_runs
+    job = run('grant_script', {'script_id': script.id})
+
+    assert job.status == 'completed'
+    assert UserAccess.query.filter_by(pine_script_id=script.id).count() == 7
+    assert UserAccess.query.filter_by(pine_script_id=script.id, user_id=self_granted.id).count() == 1
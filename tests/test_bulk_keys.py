@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import AccessKey
+import bulk_keys
+
+
+def test_parse_key_requests_reports_bad_lines():
+    entries, errors = bulk_keys.parse_key_requests("name,email\nAda,ada@example.com\nBob,not-an-email\n,\nCy\n")
+    assert entries == [{'user_name': 'Ada', 'user_email': 'ada@example.com'}]
+    assert errors == ["Line 3: invalid email 'not-an-email'", "Line 5: expected name and email"]
+
+
+def test_issue_keys_creates_distinct_active_keys(app):
+    entries = [{'user_name': f'user{n}', 'user_email': f'user{n}@example.com'} for n in range(25)]
+
+    issued = bulk_keys.issue_keys(entries, batch_size=10)
+
+    assert len({row['key_code'] for row in issued}) == 25
+    assert AccessKey.query.filter_by(status='active').count() == 25
+
+
+def test_failed_import_leaves_no_keys_behind(app):
+    entries = [{'user_name': f'user{n}', 'user_email': f'user{n}@example.com'} for n in range(25)]
+    entries[-1]['user_name'] = None  # the last batch fails
+
+    with pytest.raises(IntegrityError):
+        bulk_keys.issue_keys(entries, batch_size=10)
+    db.session.rollback()
+
+    assert AccessKey.query.count() == 0
@@ -0,0 +1,36 @@
+import pytest
+import data_recovery
+
+COUNTS = {'users': 1, 'access_keys': 0, 'pine_scripts': 1, 'user_accesses': 0, 'access_logs': 0, 'admins': 1}
+
+
+@pytest.fixture
+def recovery(monkeypatch):
+    monkeypatch.setattr(data_recovery, '_health_cache', {})
+    return data_recovery.DataRecovery()
+
+
+def test_failed_health_check_is_not_cached(recovery, monkeypatch):
+    def missing_tables(use_reltuples=False):
+        raise RuntimeError('no such table: users')
+
+    monkeypatch.setattr(recovery, '_query_counts', missing_tables)
+    failed = recovery.check_database_health(approximate=False)
+    assert not failed['tables_exist']
+
+    monkeypatch.setattr(recovery, '_query_counts', lambda use_reltuples=False: dict(COUNTS))
+    healthy = recovery.check_database_health(approximate=False)
+
+    assert healthy['tables_exist'] and not healthy['cached']
+    assert healthy['issues'] == []
+
+
+def test_healthy_report_is_cached(recovery, monkeypatch):
+    calls = []
+    monkeypatch.setattr(recovery, '_query_counts', lambda use_reltuples=False: calls.append(1) or dict(COUNTS))
+
+    recovery.check_database_health(approximate=False)
+    again = recovery.check_database_health(approximate=False)
+
+    assert again['cached']
+    assert len(calls) == 1
@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from flask import current_app, jsonify
+from app import db
+from config import Config
+from models import IdempotencyRecord
+import idempotency
+
+PINE_IDS = ['PUB;one', 'PUB;two']
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user('trader', tradingview_username='tv_trader')
+
+
+@pytest.fixture
+def grant(app):
+    """A stand-in operation that counts its runs and answers like the grant route"""
+    class Grant:
+        runs = 0
+        success = True
+
+        def __call__(self):
+            self.runs += 1
+            return jsonify({'success': self.success, 'run': self.runs})
+
+    return Grant()
+
+
+def run_once(user, func, key=None, pine_ids=PINE_IDS):
+    with current_app.test_request_context():
+        return idempotency.run_once(user.id, 'grant', 'tv_trader', pine_ids, func, key=key)
+
+
+def store_record(user, key, status, age, pine_ids=PINE_IDS):
+    db.session.add(IdempotencyRecord(
+        user_id=user.id, key=key, status=status,
+        fingerprint=idempotency.fingerprint(user.id, 'grant', 'tv_trader', pine_ids),
+        response_status=200 if status == 'completed' else None,
+        response_body=json.dumps({'success': True, 'run': 0}) if status == 'completed' else None,
+        created_at=datetime.utcnow() - timedelta(seconds=age)))
+    db.session.commit()
+
+
+def test_repeated_key_replays_the_stored_response(user, grant):
+    first = run_once(user, grant, key='key-1')
+    second = run_once(user, grant, key='key-1')
+
+    assert grant.runs == 1
+    assert second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+
+
+def test_fingerprint_ignores_pine_id_order(user, grant):
+    run_once(user, grant, key='key-1')
+    replay = run_once(user, grant, key='key-1', pine_ids=list(reversed(PINE_IDS)))
+    assert grant.runs == 1
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_key_reused_for_a_different_request_is_rejected(user, grant):
+    run_once(user, grant, key='key-1')
+    response = run_once(user, grant, key='key-1', pine_ids=['PUB;other'])
+    assert response.status_code == 422
+    assert grant.runs == 1
+
+
+def test_key_still_in_progress_elsewhere_gets_409(user, grant):
+    store_record(user, 'key-1', 'in_progress', age=1)
+    response = run_once(user, grant, key='key-1')
+    assert response.status_code == 409
+    assert grant.runs == 0
+
+
+def test_failed_attempt_releases_the_key(user, grant):
+    grant.success = False
+    run_once(user, grant, key='key-1')
+    grant.success = True
+    response = run_once(user, grant, key='key-1')
+    assert grant.runs == 2
+    assert response.get_json()['success']
+
+
+def test_expired_record_is_not_replayed(user, grant):
+    store_record(user, 'key-1', 'completed', age=Config.IDEMPOTENCY_TTL + 60)
+    response = run_once(user, grant, key='key-1')
+    assert grant.runs == 1
+    assert 'Idempotent-Replayed' not in response.headers
+    assert IdempotencyRecord.query.filter_by(key='key-1').one().status == 'completed'
+
+
+def test_expired_records_are_cleaned_up_even_when_the_key_is_taken(user, grant):
+    store_record(user, 'old-key', 'completed', age=Config.IDEMPOTENCY_TTL + 60)
+    store_record(user, 'key-1', 'completed', age=1)
+
+    replay = run_once(user, grant, key='key-1')
+
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert [record.key for record in IdempotencyRecord.query] == ['key-1']
+
+
+def test_abandoned_attempt_is_taken_over_only_by_the_same_request(user, grant):
+    store_record(user, 'key-1', 'in_progress', age=3 * Config.REQUEST_DEADLINE)
+
+    mismatch = run_once(user, grant, key='key-1', pine_ids=['PUB;other'])
+    assert mismatch.status_code == 422
+    assert grant.runs == 0
+
+    taken_over = run_once(user, grant, key='key-1')
+    assert taken_over.status_code == 200
+    assert grant.runs == 1
+
+
+def test_invalid_key_is_rejected(user, grant):
+    response = run_once(user, grant, key='k' * (idempotency.MAX_KEY_LENGTH + 1))
+    assert response.status_code == 400
+    assert grant.runs == 0
+
+
+def test_concurrent_duplicates_without_a_key_share_one_run(app, user):
+    release = threading.Event()
+    runs = []
+
+    def slow_grant():
+        runs.append(1)
+        release.wait(5)
+        return jsonify({'success': True})
+
+    responses = []
+
+    def request():
+        with app.app_context():
+            responses.append(run_once(user, slow_grant))
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    while not idempotency._in_flight:
+        time.sleep(0.01)
+    duplicate = threading.Thread(target=request)
+    duplicate.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    duplicate.join(5)
+
+    assert len(runs) == 1
+    assert sorted(response.headers.get('Idempotent-Replayed', 'false') for response in responses) == ['false', 'true']
+
+
+def test_key_finished_while_checking_is_replayed_not_409(app, user, grant):
+    store_record(user, 'key-1', 'in_progress', age=1)
+    table = IdempotencyRecord.__table__
+
+    def finish_elsewhere():
+        time.sleep(0.02)
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key == 'key-1').values(
+                status='completed', response_status=200, response_body=json.dumps({'success': True, 'run': 0})))
+
+    finisher = threading.Thread(target=finish_elsewhere)
+    finisher.start()
+    response = run_once(user, grant, key='key-1')
+    finisher.join(5)
+
+    assert response.status_code == 200
+    assert response.headers['Idempotent-Replayed'] == 'true'
+    assert grant.runs == 0
+
+
+def test_concurrent_duplicates_with_the_same_key_share_one_run(app, user):
+    user = SimpleNamespace(id=user.id)  # no ORM loads from the request threads
+    release = threading.Event()
+    runs = []
+
+    def slow_grant():
+        runs.append(1)
+        release.wait(5)
+        return jsonify({'success': True})
+
+    responses = []
+
+    def request():
+        with app.app_context():
+            responses.append(run_once(user, slow_grant, key='key-1'))
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert sorted(response.status_code for response in responses) == [200, 200, 200]
+    assert IdempotencyRecord.query.filter_by(key='key-1').one().status == 'completed'
@@ -0,0 +1,32 @@
+import json
+import logging
+import queue
+import sys
+import logging_setup
+
+
+def make_record(msg, args, exc_info=None):
+    return logging.LogRecord('app', logging.ERROR, __file__, 1, msg, args, exc_info)
+
+
+def test_message_and_traceback_are_rendered_on_the_calling_thread():
+    handler = logging_setup.DeferredQueueHandler(queue.SimpleQueue())
+    items = ['PUB;one']
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = make_record('granted %s', (items,), exc_info=sys.exc_info())
+    record.route = 'grant_access'
+
+    prepared = handler.prepare(record)
+    items.append('PUB;two')  # changed after the call, before the listener runs
+
+    assert prepared.getMessage() == "granted ['PUB;one']"
+    assert prepared.args is None and prepared.exc_info is None
+    assert 'ValueError: boom' in prepared.exc_text
+    assert record.args == (items,)  # the caller's record is left alone
+
+    entry = json.loads(logging_setup.JsonFormatter().format(prepared))
+    assert entry['message'] == "granted ['PUB;one']"
+    assert entry['route'] == 'grant_access'
+    assert 'ValueError: boom' in entry['exc_info']
@@ -0,0 +1,24 @@
+from app import db
+import principal_cache
+
+
+def test_invalidate_on_commit_waits_for_the_commit(make_user):
+    user = make_user('trader')
+    principal_cache.load(user.id)
+
+    principal_cache.invalidate_on_commit([user.id])
+    assert user.id in principal_cache._cache
+
+    db.session.commit()
+    assert user.id not in principal_cache._cache
+
+
+def test_rollback_keeps_the_cached_user(make_user):
+    user = make_user('trader')
+    principal_cache.load(user.id)
+
+    principal_cache.invalidate_on_commit([user.id])
+    db.session.rollback()
+    db.session.commit()
+
+    assert user.id in principal_cache._cache
@@ -0,0 +1,142 @@
+import threading
+import time
+import pytest
+from gevent import GreenletExit
+from resilience import CircuitBreaker, Deadline, DeadlineExceeded, FairScheduler, call_with_retry
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_the_failure_count():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_release_trial_frees_the_half_open_slot():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize('error', [DeadlineExceeded('out of time'), GreenletExit()])
+def test_call_with_retry_frees_the_trial_slot_when_interrupted(error):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def interrupted():
+        raise error
+
+    with pytest.raises(type(error)):
+        call_with_retry(interrupted, breaker=breaker, attempts=1)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+
+
+def test_unbounded_deadline_splits_into_unbounded_shares():
+    child = Deadline(None).split(4)
+    assert child.expires_at is None
+    assert child.remaining() == float('inf')
+
+
+def test_split_shares_the_time_left_equally():
+    share = Deadline(10).split(4).remaining()
+    assert 2.4 < share <= 2.5
+
+
+def test_split_raises_small_shares_to_the_minimum():
+    share = Deadline(10).split(100, minimum=3).remaining()
+    assert 2.9 < share <= 3
+
+
+def test_split_minimum_never_exceeds_the_time_left():
+    share = Deadline(1).split(10, minimum=3).remaining()
+    assert share <= 1
+
+
+def test_expired_deadline_refuses_new_calls():
+    deadline = Deadline(0)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(5)
+
+
+def _queue_in_order(scheduler, callers):
+    """Start one thread per (lane, owner, name) in order, each queued before the next; returns served names"""
+    served = []
+    threads = []
+    for lane, owner, name in callers:
+        thread = threading.Thread(target=lambda l=lane, o=owner, n=name: (scheduler.acquire(l, o), served.append(n)))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+    return served
+
+
+def test_scheduler_serves_interactive_lane_first_and_owners_in_turn():
+    scheduler = FairScheduler(rate=5, burst=1, lanes=('interactive', 'bulk'))
+    scheduler.acquire('bulk', 'warmup')  # takes the free slot so everyone below has to queue
+
+    served = _queue_in_order(scheduler, [
+        ('bulk', 'job-1', 'job-1 first'),
+        ('bulk', 'job-1', 'job-1 second'),
+        ('bulk', 'job-2', 'job-2 first'),
+        ('interactive', 7, 'user 7'),
+    ])
+
+    assert served == ['user 7', 'job-1 first', 'job-2 first', 'job-1 second']
+    stats = scheduler.stats()
+    assert stats['interactive']['served'] == 1 and stats['bulk']['served'] == 4
+    assert stats['bulk']['queued'] == 0
+
+
+def test_scheduler_unknown_lane_queues_in_the_last_lane():
+    scheduler = FairScheduler(rate=5, burst=1, lanes=('interactive', 'bulk'))
+    scheduler.acquire('no-such-lane')
+    assert scheduler.stats()['bulk']['served'] == 1
+
+
+def test_scheduler_timeout_gives_up_and_leaves_the_queue():
+    scheduler = FairScheduler(rate=1, burst=1, lanes=('interactive', 'bulk'))
+    assert scheduler.acquire('bulk', 'job-1') < 0.01
+    assert scheduler.acquire('bulk', 'job-1', timeout=0.05) is None
+    assert scheduler.stats()['bulk']['queued'] == 0
+
+
+def test_scheduler_burst_and_disabled_rate_do_not_wait():
+    scheduler = FairScheduler(rate=1, burst=3)
+    assert all(scheduler.acquire() < 0.01 for _ in range(3))
+    assert FairScheduler(rate=0).acquire(timeout=0) == 0.0
@@ -0,0 +1,93 @@
+import pytest
+from app import db
+from config import Config
+from models import AccessKey, AccessLog, User, UserAccess
+import data_recovery
+import pine_catalog
+
+
+@pytest.fixture
+def client(app, make_user):
+    make_user('trader')
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'trader@example.com', 'password': 'secret123'})
+    assert response.status_code == 302
+    return client
+
+
+def grant(client, *pine_ids, username='tv_trader'):
+    response = client.post('/api/grant-access', json={'username': username, 'pine_script_ids': list(pine_ids)})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_regrant_makes_no_upstream_calls(client, tv, make_script):
+    make_script('PUB;one')
+    make_script('PUB;two')
+
+    first = grant(client, 'PUB;one', 'PUB;two')
+    assert first['success'] and first['granted_count'] == 2
+    assert tv.calls == [('grant', 'tv_trader', ('PUB;one', 'PUB;two'))]
+
+    tv.calls.clear()
+    again = grant(client, 'PUB;two', 'PUB;one')
+
+    assert again['success']
+    assert again['granted_count'] == 0 and again['already_granted'] == 2
+    assert tv.calls == []
+    assert UserAccess.query.count() == 2
+    assert AccessLog.query.count() == 2
+
+
+def test_grant_only_calls_for_scripts_not_yet_held(client, tv, make_script):
+    make_script('PUB;one')
+    make_script('PUB;two')
+    grant(client, 'PUB;one')
+    tv.calls.clear()
+
+    result = grant(client, 'PUB;one', 'PUB;two')
+
+    assert result['success'] and result['granted_count'] == 1
+    assert tv.calls == [('grant', 'tv_trader', ('PUB;two',))]
+    assert UserAccess.query.count() == 2
+
+
+@pytest.fixture
+def admin_client(app):
+    admin = User(email='admin@example.com', name='Admin', is_admin=True)
+    admin.set_password('secret123')
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    assert client.post('/admin/login', data={'access_code': 'ACCESS123'}).status_code == 302
+    return client
+
+
+@pytest.mark.parametrize('fixes, invalidated', [(['Removed duplicate Pine Scripts, kept oldest versions'], True), ([], False)])
+def test_validate_data_drops_the_script_catalogue_after_fixes(admin_client, monkeypatch, fixes, invalidated):
+    monkeypatch.setattr(data_recovery.DataRecovery, 'validate_data_integrity',
+                        lambda self, dry_run=False: {'issues_found': fixes, 'fixes_applied': fixes, 'status': 'fixed'})
+    version = pine_catalog._version
+
+    response = admin_client.post('/admin/validate-data', json={})
+
+    assert response.get_json()['success']
+    assert (pine_catalog._version != version) is invalidated
+
+
+def test_bulk_create_keys_returns_the_issued_keys(admin_client):
+    response = admin_client.post('/admin/bulk-create-keys', data='name,email\nAda,ada@example.com\n',
+                                 content_type='text/csv')
+    assert response.status_code == 200
+    assert response.headers['X-Keys-Created'] == '1'
+    assert AccessKey.query.count() == 1
+
+
+def test_bulk_create_keys_refuses_oversized_bodies_unread(admin_client, monkeypatch):
+    monkeypatch.setattr(Config, 'BULK_KEYS_MAX_BYTES', 100)
+    body = ''.join(f'user{n},user{n}@example.com\n' for n in range(10))
+
+    response = admin_client.post('/admin/bulk-create-keys', data=body, content_type='text/csv')
+
+    assert response.status_code == 413
+    assert AccessKey.query.count() == 0
@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+from resilience import Deadline
+import tradingview
+
+
+@pytest.fixture
+def api(app, monkeypatch):
+    """A real client whose login and session check never leave the process"""
+    api = tradingview.TradingViewAPI()
+    api.logins = 0
+
+    def authenticate(deadline=None):
+        api.logins += 1
+        return True
+
+    monkeypatch.setattr(api, '_authenticate', authenticate)
+    monkeypatch.setattr(api, '_check_session', lambda deadline=None: True)
+    return api
+
+
+def expire_session_in(api, seconds):
+    api.session.cookies.set('sessionid', 'session-cookie', expires=int(time.time()) + seconds)
+
+
+def test_urgent_refresh_still_waits_for_calls_in_flight(api):
+    expire_session_in(api, 30)
+    api.in_flight = 1
+
+    assert api.refresh_if_needed() is False
+    assert api.logins == 0
+
+    api.in_flight = 0
+    api.last_activity = time.monotonic()  # not idle, but the session is about to expire
+    assert api.refresh_if_needed() is True
+    assert api.logins == 1
+
+
+def test_refresh_that_is_not_urgent_waits_for_an_idle_client(api):
+    expire_session_in(api, 1800)
+    api.last_activity = time.monotonic()
+    assert api.refresh_if_needed() is False
+    assert api.logins == 0
+
+
+def test_calls_wait_while_the_cookies_are_swapped(api):
+    api._refreshing = True
+    started = time.monotonic()
+    assert api._ensure_authenticated(Deadline(0.05)) is False
+    assert time.monotonic() - started < 1
+
+
+def test_api_calls_are_counted_in_flight(api, monkeypatch):
+    seen = []
+    monkeypatch.setattr(api, '_ensure_authenticated', lambda deadline=None: seen.append(api.in_flight) and False)
+    assert api.grant_access('trader', ['PUB;one']) == []
+    assert seen == [1]
+    assert api.in_flight == 0
+
+
+def test_login_gives_up_at_the_deadline_while_another_login_runs(api):
+    api._login_lock.acquire()
+    try:
+        started = time.monotonic()
+        assert api._login(Deadline(0.05)) is False
+        assert time.monotonic() - started < 1
+    finally:
+        api._login_lock.release()
+    assert api.logins == 0
+
+
+def test_login_reuses_a_login_that_finished_while_waiting(api):
+    api._login_lock.acquire()
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(api._login(Deadline(5))))
+    waiter.start()
+    time.sleep(0.05)
+    api.last_verified = time.monotonic()  # the other thread's login succeeded
+    api._login_lock.release()
+    waiter.join(5)
+
+    assert results == [True]
+    assert api.logins == 0
+
+
+def test_login_without_contention_authenticates(api):
+    assert api._login(Deadline(5)) is True
+    assert api.logins == 1
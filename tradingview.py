@@ -4,11 +4,102 @@ import logging
 import os
 import time
 import re
+import threading
+import contextvars
+import functools
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 from config import Config
+import metrics
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, FairScheduler, call_with_retry
 
 logger = logging.getLogger(__name__)
 
+# Shared by every client in the process so an outage trips one breaker
+circuit_breaker = CircuitBreaker(
+    'tradingview',
+    failure_threshold=Config.TV_BREAKER_THRESHOLD,
+    reset_timeout=Config.TV_BREAKER_RESET_TIMEOUT
+)
+
+# Process-wide request budget: calls made for a user's request go ahead of bulk jobs,
+# and callers within a lane take turns
+LANES = ('interactive', 'bulk')
+scheduler = FairScheduler(Config.TV_RATE_LIMIT, burst=Config.TV_RATE_BURST, lanes=LANES)
+metrics.tv_queue_depth.set_function(
+    lambda: {(lane,): stats['queued'] for lane, stats in scheduler.stats().items()})
+
+# (lane, owner) for TradingView calls made in the current thread or greenlet
+_call_lane = contextvars.ContextVar('tradingview_call_lane', default=None)
+
+
+@contextmanager
+def call_lane(lane, owner):
+    """Schedule TradingView calls made inside the block in `lane`, queued fairly per `owner`"""
+    token = _call_lane.set((lane, owner))
+    try:
+        yield
+    finally:
+        _call_lane.reset(token)
+
+
+def _current_lane():
+    """Lane and owner for the next call: an explicit call_lane(), else the logged-in user's interactive lane"""
+    lane = _call_lane.get()
+    if lane is not None:
+        return lane
+    from flask import has_request_context, request
+    if has_request_context():
+        from flask_login import current_user
+        if current_user.is_authenticated:
+            return 'interactive', f'user-{current_user.get_id()}'
+        return 'interactive', request.remote_addr
+    return 'bulk', None
+
+# Metric label for each TradingView endpoint, matched on the URL path
+TV_ENDPOINTS = {
+    '/accounts/signin/': 'signin',
+    '/chart/': 'chart',
+    '/username_hint/': 'username_hint',
+    '/pine_perm/add/': 'pine_perm_add',
+    '/pine_perm/remove/': 'pine_perm_remove',
+    '/pine_perm/list_users/': 'pine_perm_list_users',
+}
+
+
+class InstrumentedAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter that records latency and status of every TradingView call"""
+    
+    def send(self, request, **kwargs):
+        endpoint = TV_ENDPOINTS.get(urlsplit(request.url).path, 'other')
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            metrics.tv_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+            metrics.tv_responses_total.inc(endpoint=endpoint, status=status)
+
+
+def _in_flight_call(method):
+    """Count a public API call as in flight until it returns, so refresh_if_needed never swaps cookies under it"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._calls:
+            self.in_flight += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            with self._calls:
+                self.in_flight -= 1
+                self.last_activity = time.monotonic()
+                self._calls.notify_all()
+    return wrapper
+
+
 class TradingViewAPI:
     """TradingView API client for managing script access"""
     
@@ -20,9 +111,27 @@ class TradingViewAPI:
         self.session_file = "session.txt"
         self.csrf_token = None
         self.session_hash = None
+        self.session_version = None
+        self.authenticated_at = None  # UTC time the current cookies were obtained
+        self.last_verified = None  # monotonic time of the last successful session check
+        self.last_activity = None  # monotonic time of the last user-facing call
+        self.in_flight = 0  # public API calls running now
+        self._refreshing = False  # a proactive refresh is swapping the cookies
+        self._calls = threading.Condition()  # guards in_flight and _refreshing
+        self._login_lock = threading.Lock()
+        self.session_store = self._create_session_store()
         self._setup_session()
         self._load_session()
     
+    def _create_session_store(self):
+        """Create the shared database session store (None if unavailable)"""
+        try:
+            from session_store import SessionStore
+            return SessionStore(self.username)
+        except Exception as e:
+            logger.warning(f"Shared session store unavailable, using {self.session_file}: {e}")
+            return None
+    
     def _setup_session(self):
         """Setup session with proper headers"""
         self.session.headers.update({
@@ -34,9 +143,15 @@ class TradingViewAPI:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
+        # Size the connection pool for many concurrent in-flight calls (gevent workers)
+        adapter = InstrumentedAdapter(pool_connections=4, pool_maxsize=Config.TV_HTTP_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def _load_session(self):
-        """Load session from file if exists"""
+        """Load session from the shared store, or from file if the store is unavailable"""
+        if self._load_shared_session():
+            return
         try:
             if os.path.exists(self.session_file):
                 with open(self.session_file, 'r') as f:
@@ -48,8 +163,32 @@ class TradingViewAPI:
         except Exception as e:
             logger.error(f"Error loading session: {e}")
     
+    def _load_shared_session(self, max_age=None):
+        """Adopt the shared session if it is newer than ours; returns True if adopted"""
+        if not self.session_store:
+            return False
+        try:
+            record = self.session_store.load(max_age=max_age)
+        except Exception as e:
+            logger.error(f"Error loading shared session: {e}")
+            return False
+        return self._adopt_record(record)
+    
+    def _adopt_record(self, record):
+        """Replace our cookies with a stored record newer than the one we hold"""
+        if not record or (self.session_version is not None and record['version'] <= self.session_version):
+            return False
+        self.session.cookies.clear()
+        for cookie_data in record['cookies']:
+            self.session.cookies.set(**cookie_data)
+        self.session_version = record['version']
+        self.authenticated_at = record.get('updated_at')
+        self.last_verified = None
+        logger.info(f"Session loaded from shared store (version {self.session_version})")
+        return True
+    
     def _save_session(self):
-        """Save current session to file"""
+        """Save current session to the shared store, or to file if the store is unavailable"""
         try:
             cookies_data = []
             for cookie in self.session.cookies:
@@ -57,9 +196,24 @@ class TradingViewAPI:
                     'name': cookie.name,
                     'value': cookie.value,
                     'domain': cookie.domain,
-                    'path': cookie.path
+                    'path': cookie.path,
+                    'expires': cookie.expires
                 })
             
+            if self.session_store:
+                try:
+                    new_version = self.session_store.save(cookies_data, self.session_version)
+                    if new_version:
+                        self.session_version = new_version
+                        logger.info(f"Session saved to shared store (version {new_version})")
+                    else:
+                        # Another worker saved a session first; converge on theirs
+                        logger.info("Shared session changed concurrently, adopting stored session")
+                        self._load_shared_session(max_age=0)
+                    return
+                except Exception as e:
+                    logger.error(f"Error saving shared session, falling back to file: {e}")
+            
             session_data = {
                 'cookies': cookies_data,
                 'timestamp': datetime.now().isoformat()
@@ -71,11 +225,15 @@ class TradingViewAPI:
         except Exception as e:
             logger.error(f"Error saving session: {e}")
     
-    def _authenticate(self):
+    def _authenticate(self, deadline=None):
         """Authenticate with TradingView"""
+        deadline = deadline or Deadline(None)
         try:
             # First, get the login page to get CSRF token
-            login_page = self.session.get(f"{self.base_url}/accounts/signin/")
+            login_page = self.session.get(
+                f"{self.base_url}/accounts/signin/",
+                timeout=deadline.timeout(Config.TV_CALL_TIMEOUT)
+            )
             if login_page.status_code != 200:
                 logger.error("Failed to access login page")
                 return False
@@ -121,11 +279,13 @@ class TradingViewAPI:
                 f"{self.base_url}/accounts/signin/",
                 data=login_data,
                 headers=login_headers,
-                allow_redirects=False  # Don't follow redirects to see the response
+                allow_redirects=False,  # Don't follow redirects to see the response
+                timeout=deadline.timeout(Config.TV_CALL_TIMEOUT)
             )
             
-            logger.debug(f"Login response status: {response.status_code}")
-            logger.debug(f"Login response headers: {dict(response.headers)}")
+            logger.debug("Login response status: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Login response headers: %s", dict(response.headers))
             
             # Check if login was successful (usually a redirect or JSON response)
             if response.status_code in [302, 303, 200]:
@@ -156,19 +316,22 @@ class TradingViewAPI:
                             return True
             
             logger.error("Authentication failed - login unsuccessful")
-            logger.debug(f"Response content snippet: {response.text[:500]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response content snippet: %s", response.text[:500])
             return False
                 
         except Exception as e:
             logger.error(f"Authentication error: {e}")
             return False
     
-    def validate_username(self, username):
+    @_in_flight_call
+    def validate_username(self, username, deadline=None):
         """Validate if a TradingView username exists using real TradingView API"""
+        deadline = deadline or Deadline(None)
         try:
             logger.info(f"Starting username validation for: {username}")
             
-            if not self._ensure_authenticated():
+            if not self._ensure_authenticated(deadline):
                 logger.error("Authentication failed for username validation")
                 return {"validuser": False, "verifiedUserName": "", "error": "Authentication failed"}
             
@@ -176,7 +339,7 @@ class TradingViewAPI:
             hint_url = f"{self.base_url}/username_hint/?s={username}"
             logger.info(f"Making request to username hint API: {hint_url}")
             
-            response = self.session.get(hint_url, timeout=10)
+            response = self._request_with_retry('get', hint_url, deadline, timeout=10)
             logger.info(f"Username hint API response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -198,24 +361,33 @@ class TradingViewAPI:
                     return {"validuser": False, "verifiedUserName": "", "error": "Invalid API response"}
             else:
                 logger.error(f"Username hint API returned status: {response.status_code}")
-                logger.debug(f"Response content: {response.text[:200]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Response content: %s", response.text[:200])
                 return {"validuser": False, "verifiedUserName": "", "error": f"API error: {response.status_code}"}
             
         except requests.exceptions.Timeout:
             logger.error("Username validation timed out")
             return {"validuser": False, "verifiedUserName": "", "error": "Request timed out"}
+        except CircuitOpenError:
+            logger.error("Username validation skipped, TradingView circuit is open")
+            return {"validuser": False, "verifiedUserName": "", "error": "TradingView temporarily unavailable"}
+        except DeadlineExceeded:
+            logger.error("Username validation ran out of time")
+            return {"validuser": False, "verifiedUserName": "", "error": "Request timed out"}
         except Exception as e:
             logger.error(f"Username validation error: {e}", exc_info=True)
             return {"validuser": False, "verifiedUserName": "", "error": str(e)}
     
-    def get_user_access(self, username, pine_ids):
+    @_in_flight_call
+    def get_user_access(self, username, pine_ids, deadline=None):
         """Get current access status for user and pine scripts using real TradingView API"""
+        deadline = deadline or Deadline(None)
+        results = []
         try:
-            if not self._ensure_authenticated():
+            if not self._ensure_authenticated(deadline):
                 return []
             
-            results = []
-            for pine_id in pine_ids:
+            for index, pine_id in enumerate(pine_ids):
                 # Use TradingView's list_users API to check access
                 list_users_url = f"{self.base_url}/pine_perm/list_users/?limit=10&order_by=-created"
                 
@@ -234,12 +406,6 @@ class TradingViewAPI:
                     'Referer': f"{self.base_url}/"
                 }
                 
-                response = self.session.post(
-                    list_users_url,
-                    data=body,
-                    headers=headers
-                )
-                
                 access_details = {
                     "pine_id": pine_id,
                     "username": username,
@@ -248,6 +414,21 @@ class TradingViewAPI:
                     "currentExpiration": datetime.now().isoformat()
                 }
                 
+                try:
+                    response = self._request_with_retry(
+                        'post',
+                        list_users_url,
+                        self._share(deadline, len(pine_ids) - index),
+                        data=body,
+                        headers=headers
+                    )
+                except Exception as e:
+                    # Keep going: one failed script must not lose the others' results
+                    access_details["error"] = self._describe_failure(e)
+                    logger.error(f"Error checking access for {pine_id}: {e}")
+                    results.append(access_details)
+                    continue
+                
                 if response.status_code == 200:
                     try:
                         data = response.json()
@@ -266,6 +447,8 @@ class TradingViewAPI:
                                 
                     except Exception as e:
                         logger.error(f"Error parsing access data for {pine_id}: {e}")
+                else:
+                    access_details["error"] = f"HTTP {response.status_code}"
                 
                 results.append(access_details)
             
@@ -273,18 +456,20 @@ class TradingViewAPI:
             
         except Exception as e:
             logger.error(f"Get access error: {e}")
-            return []
+            return results
     
-    def grant_access(self, username, pine_ids, duration="1L"):
+    @_in_flight_call
+    def grant_access(self, username, pine_ids, duration="1L", deadline=None):
         """Grant access to user for specified pine scripts"""
+        deadline = deadline or Deadline(None)
+        results = []
         try:
-            if not self._ensure_authenticated():
+            if not self._ensure_authenticated(deadline):
                 return []
             
             logger.info(f"Attempting to grant access for {username} to {len(pine_ids)} scripts")
             
-            results = []
-            for pine_id in pine_ids:
+            for index, pine_id in enumerate(pine_ids):
                 logger.info(f"Processing grant access for {username} to {pine_id}")
                 
                 # Use real TradingView Pine permission API endpoints
@@ -314,16 +499,6 @@ class TradingViewAPI:
                     'Referer': f"{self.base_url}/"
                 }
                 
-                response = self.session.post(
-                    add_access_url,
-                    data=body,
-                    headers=headers,
-                    timeout=30,
-                    verify=True
-                )
-                
-                logger.debug(f"Grant access API response: {response.status_code}")
-                
                 access_result = {
                     "pine_id": pine_id,
                     "username": username,
@@ -334,6 +509,25 @@ class TradingViewAPI:
                     "status": "Failed"
                 }
                 
+                try:
+                    response = self._request_with_retry(
+                        'post',
+                        add_access_url,
+                        self._share(deadline, len(pine_ids) - index),
+                        data=body,
+                        headers=headers,
+                        timeout=30,
+                        verify=True
+                    )
+                except Exception as e:
+                    # Keep going: one failed script must not lose the others' results
+                    access_result["status"] = f"Failed: {self._describe_failure(e)}"
+                    logger.error(f"Grant access failed for {pine_id}: {e}")
+                    results.append(access_result)
+                    continue
+                
+                logger.debug(f"Grant access API response: {response.status_code}")
+                
                 # HTTP 200 (OK) and 201 (Created) both indicate success
                 if response.status_code in [200, 201]:
                     access_result.update({
@@ -346,22 +540,24 @@ class TradingViewAPI:
                     logger.error(f"Grant access failed with status {response.status_code}")
                 
                 results.append(access_result)
-                time.sleep(0.1)  # Small delay between requests
+                self._pace(0.1)  # Small delay between requests
             
             return results
             
         except Exception as e:
             logger.error(f"Grant access error: {e}")
-            return []
+            return results
     
-    def remove_access(self, username, pine_ids):
+    @_in_flight_call
+    def remove_access(self, username, pine_ids, deadline=None):
         """Remove access from user for specified pine scripts using real TradingView API"""
+        deadline = deadline or Deadline(None)
+        results = []
         try:
-            if not self._ensure_authenticated():
+            if not self._ensure_authenticated(deadline):
                 return []
             
-            results = []
-            for pine_id in pine_ids:
+            for index, pine_id in enumerate(pine_ids):
                 # Use TradingView's remove access API
                 remove_url = f"{self.base_url}/pine_perm/remove/"
                 
@@ -380,57 +576,264 @@ class TradingViewAPI:
                     'Referer': f"{self.base_url}/"
                 }
                 
-                response = self.session.post(
-                    remove_url,
-                    data=body,
-                    headers=headers
-                )
-                
                 access_result = {
                     "pine_id": pine_id,
                     "username": username,
                     "hasAccess": True,  # Assume had access before removal
+                    "removed": False,
                     "noExpiration": False,
                     "currentExpiration": datetime.now().isoformat(),
-                    "status": "Success" if response.status_code == 200 else f"Failed: HTTP {response.status_code}"
+                    "status": "Failed"
                 }
                 
+                try:
+                    response = self._request_with_retry(
+                        'post',
+                        remove_url,
+                        self._share(deadline, len(pine_ids) - index),
+                        data=body,
+                        headers=headers
+                    )
+                except Exception as e:
+                    # Keep going: one failed script must not lose the others' results
+                    access_result["status"] = f"Failed: {self._describe_failure(e)}"
+                    logger.error(f"Failed to remove access for {username} from {pine_id}: {e}")
+                    results.append(access_result)
+                    continue
+                
                 if response.status_code == 200:
-                    access_result["hasAccess"] = False  # Access removed successfully
+                    access_result.update({
+                        "hasAccess": False,  # Access removed successfully
+                        "removed": True,
+                        "status": "Success"
+                    })
                     logger.info(f"Successfully removed access for {username} from {pine_id}")
                 else:
+                    access_result["status"] = f"Failed: HTTP {response.status_code}"
                     logger.error(f"Failed to remove access for {username} from {pine_id}: {response.status_code}")
                 
                 results.append(access_result)
-                time.sleep(0.2)  # Rate limiting
+                self._pace(0.2)  # Rate limiting
             
             return results
             
         except Exception as e:
             logger.error(f"Remove access error: {e}")
-            return []
+            return results
     
-    def _ensure_authenticated(self):
+    def _request_with_retry(self, method, url, deadline, timeout=None, **kwargs):
+        """Send a request with backoff retries behind the shared TradingView circuit breaker
+        
+        Every attempt first waits for a slot from the process-wide scheduler, in the caller's lane.
+        Each attempt's timeout is capped by `timeout` and by what is left of `deadline`.
+        """
+        timeout = timeout or Config.TV_CALL_TIMEOUT
+        
+        lane, owner = _current_lane()
+        
+        def attempt():
+            waited = scheduler.acquire(lane, owner, timeout=deadline.remaining())
+            if waited is None:
+                raise DeadlineExceeded("Request deadline exceeded waiting for the rate limit")
+            metrics.tv_schedule_wait_seconds.observe(waited, lane=lane)
+            if waited:
+                metrics.tv_wait_seconds.inc(waited, reason='rate_limit')
+            return self.session.request(method, url, timeout=deadline.timeout(timeout), **kwargs)
+        
+        return call_with_retry(
+            attempt,
+            breaker=circuit_breaker,
+            attempts=Config.TV_RETRY_ATTEMPTS,
+            base_delay=Config.TV_RETRY_BASE_DELAY,
+            max_delay=Config.TV_RETRY_MAX_DELAY,
+            deadline=deadline,
+            on_wait=lambda delay: metrics.tv_wait_seconds.inc(delay, reason='backoff')
+        )
+    
+    def _pace(self, seconds):
+        """Fixed pause between consecutive calls so we stay under TradingView's rate limit"""
+        time.sleep(seconds)
+        metrics.tv_wait_seconds.inc(seconds, reason='pacing')
+    
+    def _share(self, deadline, calls_left):
+        """Budget for the next of `calls_left` sub-calls: an equal share of the time left"""
+        return deadline.split(calls_left, minimum=Config.TV_MIN_CALL_BUDGET)
+    
+    def _describe_failure(self, error):
+        """Short, user-facing description of a failed upstream call"""
+        if isinstance(error, CircuitOpenError):
+            return "TradingView temporarily unavailable"
+        if isinstance(error, DeadlineExceeded):
+            return "Deadline exceeded"
+        if isinstance(error, requests.exceptions.Timeout):
+            return "Request timed out"
+        return str(error)
+    
+    def _ensure_authenticated(self, deadline=None):
         """Ensure session is authenticated"""
-        # Check if current session is valid
+        deadline = deadline or Deadline(None)
+        self.last_activity = time.monotonic()
+        
+        # Do not send requests while a proactive refresh is swapping the cookies
+        timeout = deadline.remaining()
+        with self._calls:
+            if not self._calls.wait_for(lambda: not self._refreshing,
+                                        timeout=None if timeout == float('inf') else timeout):
+                logger.warning("Deadline exceeded waiting for the session refresh to finish")
+                return False
+        
+        # Recently verified (by a previous call or the background refresher) and not near expiry
+        if self._recently_verified(Config.TV_SESSION_VERIFY_INTERVAL) and not self.needs_refresh():
+            return True
+        
+        if self._check_session(deadline):
+            return True
+        
+        # Another worker or instance may already have logged in
+        if self._load_shared_session(max_age=0) and self._check_session(deadline):
+            return True
+        
+        if not self._acquire_login_lease():
+            # Someone else is logging in right now; reuse their session instead of a second login
+            logger.info("Another worker is re-authenticating, waiting for shared session...")
+            try:
+                record = self.session_store.wait_for_newer(
+                    self.session_version,
+                    timeout=min(Config.TV_LOGIN_LEASE_SECONDS, deadline.remaining())
+                )
+            except Exception as e:
+                logger.error(f"Error waiting for shared session: {e}")
+                record = None
+            if self._adopt_record(record) and self._check_session(deadline):
+                return True
+        
+        # Session invalid, re-authenticate
+        logger.info("Attempting to re-authenticate...")
+        auth_result = self._login(deadline)
+        logger.info(f"Re-authentication result: {auth_result}")
+        return auth_result
+    
+    def _login(self, deadline=None):
+        """Authenticate and record when the new session was obtained
+        
+        Waits for a login already running in another thread no longer than the
+        deadline allows, and reuses it instead of logging in a second time.
+        """
+        deadline = deadline or Deadline(None)
+        waiting_since = time.monotonic()
+        timeout = deadline.remaining()
+        if not self._login_lock.acquire(timeout=-1 if timeout == float('inf') else timeout):
+            logger.warning("Deadline exceeded waiting for another TradingView login")
+            return False
+        try:
+            # Another thread logged in (or confirmed the session) while this one waited
+            if self._recently_verified(time.monotonic() - waiting_since):
+                return True
+            auth_result = self._authenticate(deadline)
+            metrics.tv_reauth_total.inc(result='success' if auth_result else 'failure')
+            if auth_result:
+                self.authenticated_at = datetime.utcnow()
+                self.last_verified = time.monotonic()
+            return auth_result
+        finally:
+            self._login_lock.release()
+    
+    def _recently_verified(self, seconds):
+        """True if the session was confirmed valid within the last `seconds`"""
+        return self.last_verified is not None and time.monotonic() - self.last_verified < seconds
+    
+    def session_expiry(self):
+        """Earliest expiry (UTC) of the sessionid cookie, or None if it has no expiry"""
+        expiries = [cookie.expires for cookie in self.session.cookies
+                    if cookie.name == 'sessionid' and cookie.expires]
+        if not expiries:
+            return None
+        return datetime.utcfromtimestamp(min(expiries))
+    
+    def needs_refresh(self):
+        """Return why the session should be renewed ahead of time, or None"""
+        expiry = self.session_expiry()
+        if expiry and expiry - datetime.utcnow() < timedelta(seconds=Config.TV_REFRESH_BEFORE_EXPIRY):
+            return 'expiring'
+        if self.authenticated_at and \
+                datetime.utcnow() - self.authenticated_at > timedelta(seconds=Config.TV_SESSION_MAX_AGE):
+            return 'max_age'
+        return None
+    
+    def refresh_if_needed(self):
+        """Renew the session ahead of expiry while no API call is in flight (called by SessionRefresher)
+        
+        Normally also waits for TV_REFRESH_IDLE_SECONDS without calls; a session
+        about to expire skips that wait, but never logs in under a running call.
+        Calls that start during the login wait for it to finish. Returns True if
+        a new login was performed.
+        """
+        # Pick up a session another worker refreshed
+        self._load_shared_session()
+        
+        with self._calls:
+            busy = self.in_flight > 0
+            idle = not busy and (self.last_activity is None or
+                                 time.monotonic() - self.last_activity >= Config.TV_REFRESH_IDLE_SECONDS)
+        reason = self.needs_refresh()
+        
+        if reason is None:
+            # Keep the verification fresh so user-facing calls can skip the check
+            if idle and self._get_session_id() and \
+                    not self._recently_verified(Config.TV_SESSION_VERIFY_INTERVAL / 2):
+                self._check_session()
+            return False
+        
+        expiry = self.session_expiry()
+        urgent = expiry is not None and \
+            expiry - datetime.utcnow() < timedelta(seconds=2 * Config.TV_REFRESH_INTERVAL)
+        if busy or (not idle and not urgent):
+            logger.debug(f"Session refresh due ({reason}) but requests are in flight, deferring")
+            return False
+        
+        if not self._acquire_login_lease():
+            return False
+        
+        with self._calls:
+            if self.in_flight:
+                logger.debug(f"Session refresh due ({reason}) but a request just started, deferring")
+                return False
+            self._refreshing = True
+        try:
+            logger.info(f"Proactively refreshing TradingView session ({reason})")
+            return self._login()
+        finally:
+            with self._calls:
+                self._refreshing = False
+                self._calls.notify_all()
+    
+    def _check_session(self, deadline=None):
+        """Check whether the current cookies still hold a valid TradingView session"""
+        deadline = deadline or Deadline(None)
         try:
             logger.info("Checking current session validity...")
-            test_response = self.session.get(f"{self.base_url}/chart/", timeout=10)
+            test_response = self.session.get(f"{self.base_url}/chart/", timeout=deadline.timeout(10))
             logger.debug(f"Session check response: {test_response.status_code}, URL: {test_response.url}")
             
             if test_response.status_code == 200 and 'accounts/signin' not in test_response.url:
                 logger.info("Current session is valid")
+                self.last_verified = time.monotonic()
                 return True
             else:
                 logger.warning("Current session is invalid - needs re-authentication")
         except Exception as e:
             logger.error(f"Session check failed: {e}")
-        
-        # Session invalid, re-authenticate
-        logger.info("Attempting to re-authenticate...")
-        auth_result = self._authenticate()
-        logger.info(f"Re-authentication result: {auth_result}")
-        return auth_result
+        return False
+    
+    def _acquire_login_lease(self):
+        """Claim the shared login lease; True when this worker should log in"""
+        if not self.session_store:
+            return True
+        try:
+            return self.session_store.acquire_login_lease()
+        except Exception as e:
+            logger.error(f"Error acquiring login lease: {e}")
+            return True
     
     def _get_fresh_csrf_token(self):
         """Get a fresh CSRF token from the current session"""
@@ -498,5 +901,52 @@ class TradingViewAPI:
             logger.error(f"Error calculating expiration: {e}")
             return None
 
-# Global API instance
-tv_api = TradingViewAPI()
+class SessionRefresher(threading.Thread):
+    """Background thread that renews the TradingView session before it expires"""
+    
+    def __init__(self, api, app):
+        super().__init__(name='tv-session-refresher', daemon=True)
+        self.api = api
+        self.app = app
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        while not self._stop_event.wait(Config.TV_REFRESH_INTERVAL):
+            try:
+                with self.app.app_context():
+                    self.api.refresh_if_needed()
+            except Exception as e:
+                logger.error(f"Background session refresh failed: {e}")
+    
+    def stop(self):
+        self._stop_event.set()
+
+
+# Shared API instance, created on first use so importing this module stays cheap
+_tv_api = None
+_tv_api_lock = threading.Lock()
+_refresher = None
+
+def get_tv_api():
+    """Return the process-wide TradingViewAPI client, creating it lazily"""
+    global _tv_api
+    if _tv_api is None:
+        with _tv_api_lock:
+            if _tv_api is None:
+                _tv_api = TradingViewAPI()
+                if Config.TV_BACKGROUND_REFRESH:
+                    start_session_refresher(_tv_api)
+    return _tv_api
+
+def start_session_refresher(api):
+    """Start the background refresher for api (needs an active Flask app context)"""
+    global _refresher
+    from flask import current_app, has_app_context
+    if not has_app_context():
+        logger.warning("No app context, background session refresh not started")
+        return None
+    if _refresher is None or not _refresher.is_alive():
+        _refresher = SessionRefresher(api, current_app._get_current_object())
+        _refresher.start()
+        logger.info("Background TradingView session refresher started")
+    return _refresher